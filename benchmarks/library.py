@@ -0,0 +1,166 @@
+"""Generate a library of synthetic tagged MP3 files.
+
+Run `python -m benchmarks.library <directory> <number of files>`."""
+
+import argparse
+import os
+import random
+import shutil
+
+from mutagen.id3 import APIC, ID3, TALB, TCON, TDRC, TIT2, TPE1, TPE2, TPOS, TRCK
+
+# MPEG 1 layer 3 frame, 128 kbps, 44100 Hz, stereo, without padding
+MP3_FRAME = b"\xff\xfb\x90\x64" + b"\x00" * 413
+# about 10 s of audio
+MP3_FRAMES = 380
+
+COVER_SIZE = 32 * 1024
+
+
+def generate(
+    root: str,
+    nb_files: int,
+    nb_artists: int = 0,
+    nb_albums: int = 0,
+    nb_genres: int = 20,
+    skew: float = 1.0,
+    covers: float = 0.5,
+    bad_files: float = 0.01,
+    seed: int = 0,
+) -> list[str]:
+    """Write the files of a synthetic library, as artist/album/track.mp3
+
+    Args:
+        root (str): the directory of the library
+        nb_files (int): number of music files
+        nb_artists (int, optional): number of artists, nb_files / 100 if 0
+        nb_albums (int, optional): number of albums, nb_files / 10 if 0
+        nb_genres (int, optional): number of genres
+        skew (float, optional): Zipf exponent of the number of albums
+            per artist and of songs per genre, 0 for an even distribution
+        covers (float, optional): part of the albums with an embedded cover
+        bad_files (float, optional): part of the files that are not valid MP3
+        seed (int, optional): seed of the random generator
+
+    Returns:
+        list[str]: the paths of the valid music files
+    """
+    rand = random.Random(seed)
+    nb_artists = nb_artists or max(1, nb_files // 100)
+    nb_albums = max(nb_albums or nb_files // 10, 1)
+
+    artist_weights = [1 / (i + 1) ** skew for i in range(nb_artists)]
+    genre_weights = [1 / (i + 1) ** skew for i in range(nb_genres)]
+    cover = b"\xff\xd8\xff\xe0" + rand.randbytes(COVER_SIZE)
+
+    album_artists = rand.choices(range(nb_artists), artist_weights, k=nb_albums)
+    album_genres = rand.choices(range(nb_genres), genre_weights, k=nb_albums)
+    album_covers = [rand.random() < covers for _ in range(nb_albums)]
+    album_sizes = [0] * nb_albums
+    result: list[str] = []
+
+    for i in range(nb_files):
+        album = i % nb_albums
+        artist = album_artists[album]
+        album_sizes[album] += 1
+        track = album_sizes[album]
+
+        directory = os.path.join(root, f"Artist {artist:05}", f"Album {album:06}")
+        file_path = os.path.join(directory, f"{track:03} - Song {i}.mp3")
+        os.makedirs(directory, exist_ok=True)
+
+        if rand.random() < bad_files:
+            with open(file_path, "wb") as file:
+                file.write(rand.randbytes(rand.randrange(0, 4096)))
+            continue
+
+        with open(file_path, "wb") as file:
+            file.write(MP3_FRAME * MP3_FRAMES)
+
+        tags = ID3()
+        tags.add(TIT2(encoding=3, text=f"Song {i}"))
+        # some songs have a guest artist
+        if rand.random() < 0.1:
+            guest = rand.randrange(nb_artists)
+            tags.add(
+                TPE1(encoding=3, text=f"Artist {artist:05} feat. Artist {guest:05}")
+            )
+        else:
+            tags.add(TPE1(encoding=3, text=f"Artist {artist:05}"))
+        tags.add(TPE2(encoding=3, text=f"Artist {artist:05}"))
+        tags.add(TALB(encoding=3, text=f"Album {album:06}"))
+        tags.add(TCON(encoding=3, text=f"Genre {album_genres[album]:03}"))
+        tags.add(TDRC(encoding=3, text=str(1960 + album % 60)))
+        tags.add(TRCK(encoding=3, text=str(track)))
+        tags.add(TPOS(encoding=3, text="1/1"))
+        if album_covers[album]:
+            tags.add(APIC(encoding=3, mime="image/jpeg", type=3, data=cover))
+        tags.save(file_path)
+
+        result.append(file_path)
+
+    return result
+
+
+def modify(
+    file_paths: list[str], ratio: float, seed: int = 0, in_place: bool = False
+) -> int:
+    """Change the title of a part of the files, and returns the number of
+    changed files.
+
+    By default, a copy is written then renamed over the file, so the
+    directory mtime changes too. With in_place, the tags are rewritten in
+    the file (as tag editors do when the tag has enough padding), so the
+    directory mtime does not change. The file mtime is moved forward
+    so the change is seen even within the same second."""
+    rand = random.Random(seed)
+    changed = rand.sample(file_paths, int(len(file_paths) * ratio))
+
+    for file_path in changed:
+        if in_place:
+            tags = ID3(file_path)
+            tags.add(TIT2(encoding=3, text=f"{tags['TIT2'].text[0]} (edit)"))
+            tags.save(file_path)
+
+            stats = os.stat(file_path)
+            os.utime(file_path, (stats.st_atime, stats.st_mtime + 10))
+            continue
+
+        temp_path = file_path + ".tmp"
+        shutil.copyfile(file_path, temp_path)
+
+        tags = ID3(temp_path)
+        tags.add(TIT2(encoding=3, text=f"{tags['TIT2'].text[0]} (edit)"))
+        tags.save(temp_path)
+
+        stats = os.stat(file_path)
+        os.utime(temp_path, (stats.st_atime, stats.st_mtime + 10))
+        os.replace(temp_path, file_path)
+
+    return len(changed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("directory")
+    parser.add_argument("files", type=int)
+    parser.add_argument("--artists", type=int, default=0)
+    parser.add_argument("--albums", type=int, default=0)
+    parser.add_argument("--genres", type=int, default=20)
+    parser.add_argument("--skew", type=float, default=1.0)
+    parser.add_argument("--covers", type=float, default=0.5)
+    parser.add_argument("--bad-files", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    generate(
+        args.directory,
+        args.files,
+        nb_artists=args.artists,
+        nb_albums=args.albums,
+        nb_genres=args.genres,
+        skew=args.skew,
+        covers=args.covers,
+        bad_files=args.bad_files,
+        seed=args.seed,
+    )
@@ -0,0 +1,138 @@
+"""Measure the throughput of database.scan.
+
+For each library size, a synthetic library is generated, then scanned
+from an empty database (cold), scanned again without changes (no change),
+scanned after changing a part of the files (partial change), scanned after
+changing other files in place (in-place change, missed when directories
+are not listed again), and scanned checking every file (full).
+
+Run `python -m benchmarks.scan`, the results are printed as JSON."""
+
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+
+from src import database
+from src.database import base_model
+from src.database.progress import ScanProgress
+
+from . import library
+
+
+class QueryCounter(logging.Handler):
+    """Count the SQL statements logged by peewee"""
+
+    def __init__(self) -> None:
+        super().__init__(logging.DEBUG)
+        self.count = 0
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.count += 1
+
+
+def measure(
+    case: str, music_dir: str, nb_files: int, counter: QueryCounter, **kwargs
+) -> dict:
+    """Scan the library, and returns the wall time, number of parsed files,
+    of files that could not be parsed and of SQL statements"""
+    counter.count = 0
+    output = io.StringIO()
+    progress = ScanProgress()
+
+    start_time = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        database.scan([music_dir], progress=progress, **kwargs)
+    total_time = time.perf_counter() - start_time
+
+    return {
+        "case": case,
+        "files": nb_files,
+        "seconds": round(total_time, 3),
+        "files_per_second": round(nb_files / total_time, 1),
+        "parsed": progress.parsed,
+        "errors": progress.errors,
+        "sql_statements": counter.count,
+    }
+
+
+def run(
+    sizes: list[int], change: float, workers: int | None, work_dir: str
+) -> list[dict]:
+    counter = QueryCounter()
+    logger = logging.getLogger("peewee")
+    logger.addHandler(counter)
+    logger.setLevel(logging.DEBUG)
+
+    results: list[dict] = []
+
+    for size in sizes:
+        music_dir = os.path.join(work_dir, f"library-{size}")
+        print(f"Generating {size} files in {music_dir}", file=sys.stderr)
+        file_paths = library.generate(music_dir, size)
+
+        base_model.db.init(os.path.join(work_dir, f"library-{size}.db"))
+
+        # the JSON report is the only output on stdout
+        with contextlib.redirect_stdout(sys.stderr):
+            database.init()
+
+        for case in ["cold", "no change", "partial change", "in-place change", "full"]:
+            if case == "partial change":
+                library.modify(file_paths, change)
+            elif case == "in-place change":
+                library.modify(file_paths, change, seed=1, in_place=True)
+
+            result = measure(
+                case, music_dir, size, counter, workers=workers, full=case == "full"
+            )
+            print(json.dumps(result), file=sys.stderr)
+            results.append(result)
+
+        base_model.db.close()
+
+    logger.removeHandler(counter)
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000]
+    )
+    parser.add_argument(
+        "--change", type=float, default=0.01, help="part of the files changed"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None, help="processes parsing files"
+    )
+    parser.add_argument(
+        "--dir", default=None, help="directory of the libraries, temporary if unset"
+    )
+    parser.add_argument("--output", default=None, help="JSON file of the results")
+    args = parser.parse_args()
+
+    with contextlib.ExitStack() as stack:
+        work_dir = args.dir or stack.enter_context(tempfile.TemporaryDirectory())
+        results = run(args.sizes, args.change, args.workers, work_dir)
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "workers": args.workers,
+        "results": results,
+    }
+
+    if args.output is None:
+        print(json.dumps(report, indent=2))
+    else:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
@@ -1,7 +1,15 @@
-from . import database, gui
+import sys
 
 # TODO Add logging
 
 if __name__ == "__main__":
+    # with arguments, run a command without loading the GUI and audio modules
+    if len(sys.argv) > 1:
+        from . import cli
+
+        sys.exit(cli.main())
+
+    from . import database, gui
+
     database.init()
     gui.start()
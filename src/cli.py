@@ -0,0 +1,183 @@
+"""Command line interface, to manage the database without the GUI.
+
+Only the database package is imported, so it can run without a display
+or an audio device (from cron for example)."""
+
+import argparse
+import contextlib
+import json
+import signal
+import sys
+import time
+
+from . import database
+from .database import base_model
+from .database.scheduler import BudgetedProgress, lower_priority
+from .database.setting import Key, Setting
+
+# exit codes
+EXIT_OK = 0
+EXIT_PROBLEMS = 1  # verify found problems, the scan was cancelled or incomplete
+EXIT_USAGE = 2  # same as argparse
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m src", description=__doc__)
+    parser.add_argument(
+        "--database", default=base_model.DATABASE_FILE, help="database file"
+    )
+    parser.add_argument("--json", action="store_true", help="print the result as JSON")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    scan_parser = commands.add_parser("scan", help="scan the music directories")
+    scan_parser.add_argument(
+        "directories", nargs="*", help="directories to scan (MUSIC_DIR setting if none)"
+    )
+    scan_parser.add_argument(
+        "--full", action="store_true", help="check every file, even unchanged ones"
+    )
+    scan_parser.add_argument(
+        "--workers", type=int, default=None, help="processes parsing files"
+    )
+    scan_parser.add_argument(
+        "--low-priority",
+        action="store_true",
+        help="scan with the lowest CPU and I/O priorities, parsing files one by one",
+    )
+    scan_parser.add_argument(
+        "--files-per-second", type=float, default=0, help="maximum scan speed"
+    )
+    scan_parser.add_argument(
+        "--bytes-per-second", type=float, default=0, help="maximum parsing speed"
+    )
+
+    commands.add_parser("stats", help="print the number of songs, albums...")
+    commands.add_parser("vacuum", help="rebuild the database file")
+    commands.add_parser("verify", help="check the database and the song files")
+
+    args = parser.parse_args(argv)
+
+    base_model.db.init(args.database)
+
+    # migrations print what they do, only JSON results go to stdout
+    with contextlib.redirect_stdout(sys.stderr if args.json else sys.stdout):
+        database.init()
+
+    match args.command:
+        case "scan":
+            if args.low_priority:
+                lower_priority(whole_process=True)
+                args.workers = 1
+
+            progress = BudgetedProgress(args.files_per_second, args.bytes_per_second)
+
+            return scan(args.directories, args.full, args.workers, progress, args.json)
+        case "stats":
+            return stats(args.json)
+        case "vacuum":
+            return vacuum(args.json)
+        case "verify":
+            return verify(args.json)
+
+    return EXIT_USAGE
+
+
+def scan(
+    directories: list[str],
+    full: bool,
+    workers: int | None,
+    progress: BudgetedProgress,
+    as_json: bool,
+) -> int:
+    # the songs outside the given directories are kept
+    partial = len(directories) > 0
+
+    if not partial:
+        setting = Setting.get_value(Key.MUSIC_DIR)
+        directories = setting.split(";") if setting != "" else []
+
+    if len(directories) == 0:
+        print("No directory to scan", file=sys.stderr)
+        return EXIT_USAGE
+
+    # stop the scan cleanly, the songs written so far are kept
+    signal.signal(signal.SIGINT, lambda *_: progress.cancel())
+    signal.signal(signal.SIGTERM, lambda *_: progress.cancel())
+
+    start_time = time.time()
+
+    # the JSON result is the only output on stdout
+    with contextlib.redirect_stdout(sys.stderr if as_json else sys.stdout):
+        completed = database.scan(
+            directories,
+            workers=workers,
+            full=full,
+            progress=progress,
+            partial=partial,
+        )
+
+    result = {
+        "completed": completed,
+        "seconds": round(time.time() - start_time, 3),
+        "seen": progress.seen,
+        "parsed": progress.parsed,
+        "written": progress.written,
+        "moved": progress.moved,
+        "deleted": progress.deleted,
+        "errors": progress.errors,
+        "unreachable": progress.unreachable,
+    }
+    _print(result, as_json)
+
+    if not completed or len(progress.unreachable) > 0:
+        return EXIT_PROBLEMS
+
+    return EXIT_OK
+
+
+def stats(as_json: bool) -> int:
+    if as_json:
+        _print(database.get_stats(), True)
+    else:
+        database.print_stats()
+
+    return EXIT_OK
+
+
+def vacuum(as_json: bool) -> int:
+    start_time = time.time()
+
+    with contextlib.redirect_stdout(sys.stderr if as_json else sys.stdout):
+        database.compact()
+
+    if as_json:
+        _print({"seconds": round(time.time() - start_time, 3)}, True)
+
+    return EXIT_OK
+
+
+def verify(as_json: bool) -> int:
+    result = database.verify()
+    _print(result, as_json)
+
+    if len(result["integrity"]) > 0 or len(result["missing_files"]) > 0:
+        return EXIT_PROBLEMS
+
+    return EXIT_OK
+
+
+def _print(result: dict, as_json: bool) -> None:
+    if as_json:
+        print(json.dumps(result, indent=2))
+        return
+
+    for key, value in result.items():
+        if isinstance(value, list):
+            print(f"{key} : {len(value)}")
+            for item in value:
+                if isinstance(item, tuple):
+                    print("   ", *item)
+                else:
+                    print("   ", item)
+        else:
+            print(f"{key} : {value}")
@@ -1,110 +1,489 @@
+import concurrent.futures
+import multiprocessing
 import os
-import pathlib
+import threading
 import time
+from collections.abc import Callable
 from datetime import timedelta
+from typing import NamedTuple
 
-from mutagen.easyid3 import EasyID3
-from mutagen.id3._util import ID3NoHeaderError
-from mutagen.mp3 import MP3, HeaderNotFoundError
-from peewee import ModelSelect, fn
+from peewee import ModelSelect, chunked, fn
 
 from . import base_model as db
-from . import utils
+from . import facets, fts, ingest, migrations, rows, tags
 from .album import Album
 from .artist import Artist
+from .bad_file import BadFile
+from .cache import cached, query_cache
+from .directory import Directory
+from .facets import Facet, FacetValue
 from .genre import Genre
-from .setting import Setting
-from .song import Song
+from .progress import ScanCancelled, ScanProgress
+from .rows import SongRow
+from .scheduler import ScanScheduler
+from .setting import Key, Setting
+from .song import AlbumArtist, Song
+from .watcher import Watcher
 
 DATABASE_MODELS = [Artist, Album, Genre, Song]
 
+# under this number of files to parse, starting worker processes is not worth it
+POOL_MIN_FILES = 50
+POOL_CHUNK_SIZE = 16
+
+# scan and update can be called from different threads, only one can run at a time
+scan_lock = threading.Lock()
+
+# setting => SQLite pragma, to tune the database
+PRAGMA_SETTINGS = {
+    Key.DB_CACHE_SIZE: "cache_size",
+    Key.DB_MMAP_SIZE: "mmap_size",
+    Key.DB_TEMP_STORE: "temp_store",
+}
+
 
 def init() -> None:
-    db.init(DATABASE_MODELS + [Setting])
+    db.init(DATABASE_MODELS + [BadFile, Directory, Setting])
+    migrations.migrate()
+
+    for key, pragma in PRAGMA_SETTINGS.items():
+        value = Setting.get_value(key)
+
+        if value != "":
+            db.set_pragma(pragma, value)
+
+
+def scan(
+    music_dirs: list[str],
+    workers: int | None = None,
+    batch_size: int = ingest.BATCH_SIZE,
+    full: bool = False,
+    threads: dict[str, int] | None = None,
+    progress: ScanProgress | None = None,
+    partial: bool = False,
+) -> bool:
+    """Scan music directories and update the database.
+
+    Songs are written by batches, so an interrupted scan does not need
+    to parse again the files already written. Files that can't be parsed
+    are skipped until they change. Songs of a music directory that can't
+    be accessed are kept.
+
+    Args:
+        music_dirs (list[str]): the directories to scan
+        workers (int | None, optional): number of processes parsing files.
+            If None, the SCAN_WORKERS setting is used (0 = number of CPUs).
+        batch_size (int, optional): number of songs written per transaction.
+        full (bool, optional): check every file, even in directories whose
+            listing did not change. Needed to find files modified in place.
+        threads (dict[str, int] | None, optional): number of threads listing
+            directories, for each music directory (1 if not set). Network
+            shares are faster with several threads. If None, the SCAN_THREADS
+            setting is used.
+        progress (ScanProgress | None, optional): counters updated during the
+            scan, that can also cancel it. Its changed attribute tells if
+            the database changed, even for a cancelled scan.
+        partial (bool, optional): only some of the music directories are
+            scanned, the songs outside them are kept (and can't be found
+            as moved files).
+
+    Returns:
+        bool: False if the scan was cancelled
+    """
+    if threads is None:
+        threads = get_scan_threads()
+
+    if progress is None:
+        progress = ScanProgress()
+
+    with scan_lock:
+        # Insert/update data
+        songs = ingest.Ingest(batch_size)
+        to_parse: list[tuple[str, int, int]] = []
+
+        for music_dir in music_dirs:
+            print(f"Scanning {music_dir}")
+
+            start_time = time.time()
+
+            try:
+                to_parse += _scan_dir(
+                    music_dir, songs, progress, full, threads.get(music_dir, 1)
+                )
+            except ScanCancelled:
+                print("Scan cancelled")
+                return False
+            except OSError as e:
+                print(f"Cannot scan {music_dir} ({e}), keeping its songs")
+                songs.keep(os.path.normpath(music_dir))
+                progress.unreachable.append(music_dir)
+                continue
+
+            total_time = round(time.time() - start_time, 2)
+            print(f"Successfully scanned {music_dir} in {total_time} s")
+
+        paths = [os.path.normpath(path) for path in music_dirs] if partial else None
+
+        # moved files don't need to be parsed
+        start_time = time.time()
+        to_parse = songs.find_moves(to_parse, paths)
+        # songs from older versions are parsed once more to store their hash
+        to_parse = songs.add_unhashed(to_parse)
+        songs.start_checkpoints(to_parse)
+
+        # the parsed files are kept, a next scan will continue from them
+        try:
+            _parse_files(to_parse, workers, songs, progress)
+            songs.flush()
+
+            progress.written = songs.nb_written
+            progress.moved = songs.nb_moved
+            progress.errors = songs.nb_errors
+            progress.report(True)
+        except ScanCancelled:
+            songs.flush()
+            progress.changed = songs.nb_written > 0 or songs.nb_moved > 0
+
+            if progress.changed:
+                query_cache.invalidate()
+            print("Scan cancelled")
+            return False
+
+        total_time = round(time.time() - start_time, 2)
+        print(f"Found {songs.nb_moved} moved files")
+        print(f"Could not parse {songs.nb_errors} files")
+        print(f"Successfully parsed {len(to_parse)} files in {total_time} s")
+
+        # Delete songs not found, and what is not used anymore
+        progress.deleted = songs.sweep(paths)
+        progress.changed = (
+            len(to_parse) > 0 or songs.nb_moved > 0 or progress.deleted > 0
+        )
+        songs.save_directories(paths)
+
+        # only the free pages are released, a full VACUUM is done by compact()
+        db.incremental_vacuum()
+
+        # the cached query results are not valid anymore
+        if progress.changed:
+            query_cache.invalidate()
+
+    return True
+
+
+def update(paths: list[str], workers: int | None = None) -> bool:
+    """Update the database for some files or directories only.
+
+    Existing files are added or updated, the songs of missing files are deleted.
+
+    Args:
+        paths (list[str]): the changed files or directories
+        workers (int | None, optional): number of processes parsing files.
+
+    Returns:
+        bool: True if the database changed
+    """
+    # ignore paths inside another path of the list, they are scanned with it
+    paths = sorted({os.path.normpath(path) for path in paths})
+    paths = [path for i, path in enumerate(paths) if not ingest.is_in(path, paths[:i])]
+
+    with scan_lock:
+        songs = ingest.Ingest()
+        progress = ScanProgress()
+        to_parse: list[tuple[str, int, int]] = []
+
+        for path in paths:
+            if os.path.isfile(path):
+                file_info = _check_file(path, os.stat(path), songs)
+                if file_info is not None:
+                    to_parse.append(file_info)
+            elif os.path.isdir(path):
+                to_parse += _scan_dir(path, songs, progress, True)
+
+        to_parse = songs.find_moves(to_parse, paths)
+        _parse_files(to_parse, workers, songs, progress)
+        songs.flush()
+        nb_deleted = songs.sweep(paths)
+
+        if nb_deleted > 0:
+            db.incremental_vacuum()
+
+        changed = len(to_parse) > 0 or songs.nb_moved > 0 or nb_deleted > 0
+
+        if changed:
+            query_cache.invalidate()
+
+    return changed
+
+
+def compact() -> None:
+    """Rebuild the database file, to defragment it"""
+    with scan_lock:
+        start_time = time.time()
+        db.vacuum()
+
+        total_time = round(time.time() - start_time, 2)
+        print(f"Successfully compacted the database in {total_time} s")
+
+
+def is_busy() -> bool:
+    """Returns True while a scan, an update or a compaction is running"""
+    return scan_lock.locked()
+
+
+def schedule_scans(
+    music_dirs: list[str],
+    on_update: Callable[[], None],
+    should_pause: Callable[[], bool] | None = None,
+) -> ScanScheduler | None:
+    """Rescan music directories periodically, in a low priority thread.
+
+    The SCAN_INTERVAL setting is the number of minutes between two scans
+    (0 to disable them). The SCAN_FILES_PER_SECOND and SCAN_BYTES_PER_SECOND
+    settings limit the speed of the scans (0 for no limit).
+
+    Args:
+        music_dirs (list[str]): the directories to scan
+        on_update (Callable[[], None]): called (from the scheduler thread)
+            after each scan that changed the database
+        should_pause (Callable[[], bool] | None, optional): no scan runs
+            while it returns True, a running scan stops and continues later
+
+    Returns:
+        ScanScheduler | None: the started scheduler, to stop when not needed
+            anymore. None if the scans are disabled.
+    """
+    interval = float(Setting.get_value(Key.SCAN_INTERVAL, "0")) * 60
+
+    if interval <= 0 or len(music_dirs) == 0:
+        return None
+
+    def do_scan(progress: ScanProgress) -> None:
+        # files are parsed one by one, so the speed limit applies to parsing
+        scan(music_dirs, workers=1, progress=progress)
+
+        # a paused scan keeps the songs it wrote
+        if progress.changed:
+            on_update()
+
+    scheduler = ScanScheduler(
+        do_scan,
+        interval,
+        float(Setting.get_value(Key.SCAN_FILES_PER_SECOND, "0")),
+        float(Setting.get_value(Key.SCAN_BYTES_PER_SECOND, "0")),
+        should_pause,
+    )
+    scheduler.start()
+
+    return scheduler
+
+
+def watch(music_dirs: list[str], on_update: Callable[[], None]) -> Watcher:
+    """Watch music directories, and update the database when files change.
+
+    Args:
+        music_dirs (list[str]): the directories to watch
+        on_update (Callable[[], None]): called (from the watcher thread)
+            when the database changed
+
+    Returns:
+        Watcher: the started watcher, to stop when not needed anymore
+    """
+
+    def do_update(paths: list[str]) -> None:
+        # the songs of a root that can't be accessed (unmounted disk or share)
+        # are kept, as during a scan
+        roots = [os.path.normpath(root) for root in music_dirs if os.path.isdir(root)]
+        paths = [path for path in paths if ingest.is_in(path, roots)]
+
+        if len(paths) > 0 and update(paths):
+            on_update()
+
+    watcher = Watcher(music_dirs, do_update)
+    watcher.start()
+
+    return watcher
+
+
+class _Listing(NamedTuple):
+    path: str
+    mtime: int
+    nb_entries: int
+    directories: list[tuple[str, os.stat_result]]
+    # stats are None for the known files of an unchanged directory
+    files: list[tuple[str, os.stat_result | None]]
+
 
+def _scan_dir(
+    path: str,
+    songs: ingest.Ingest,
+    progress: ScanProgress,
+    full: bool,
+    threads: int = 1,
+) -> list[tuple[str, int, int]]:
+    """Returns the files of the directory (and sub directories) that need to be parsed.
 
-def scan(music_dirs: list[str]) -> None:
-    # Set all data satatus to 0
-    for model in DATABASE_MODELS:
-        model.update(status=0).execute()
+    If a directory has the same mtime and number of entries as during the last
+    scan, its known files are not checked (unless full is True).
+    With several threads, directories are listed concurrently."""
+    to_parse: list[tuple[str, int, int]] = []
+
+    # directories to scan, in the same order as os.walk when listed one by one
+    stack = [(os.path.normpath(path), os.stat(path))]
+
+    def add_listing(path: str, listing: _Listing | None) -> None:
+        # keep the songs of a directory that can't be listed anymore
+        if listing is None:
+            print(f"Cannot list {path}, keeping its songs")
+            songs.keep(path)
+            return
+
+        songs.add_directory(listing.path, listing.mtime, listing.nb_entries)
+
+        for file_path, file_stats in listing.files:
+            if file_stats is None:
+                songs.mark_seen(file_path)
+                continue
+
+            file_info = _check_file(file_path, file_stats, songs)
+            if file_info is not None:
+                to_parse.append(file_info)
 
-    # Insert/update data
-    for music_dir in music_dirs:
-        _scan_dir(music_dir)
+        stack.extend(reversed(listing.directories))
 
-    # Delete data with status to 0
-    for model in DATABASE_MODELS:
-        model.delete().where(model.status == 0).execute()
+        progress.seen += len(listing.files)
+        progress.report()
 
-    db.vacuum()
+    if threads <= 1:
+        while len(stack) > 0:
+            dir_path, dir_stats = stack.pop()
+            add_listing(dir_path, _list_dir(dir_path, dir_stats, songs, full))
 
+        return to_parse
 
-def _scan_dir(path: str) -> None:
-    print(f"Scanning {path}")
+    # only this thread uses the results, so songs is only read by the threads
+    with concurrent.futures.ThreadPoolExecutor(threads) as executor:
+        running: dict[concurrent.futures.Future[_Listing | None], str] = {}
 
-    start_time = time.time()
-    nb_file = 0
+        while len(stack) > 0 or len(running) > 0:
+            # keep at most one directory listing per thread in flight
+            while len(stack) > 0 and len(running) < threads:
+                dir_path, dir_stats = stack.pop()
+                future = executor.submit(_list_dir, dir_path, dir_stats, songs, full)
+                running[future] = dir_path
 
-    for root, _, files in os.walk(path):
-        for file in files:
-            if pathlib.Path(file).suffix == ".mp3":
-                nb_file += 1
-                file_path = os.path.normpath(os.path.join(root, file))
-                _scan_file(file_path)
+            done, _ = concurrent.futures.wait(
+                running, return_when=concurrent.futures.FIRST_COMPLETED
+            )
 
-    total_time = round(time.time() - start_time, 2)
-    print(f"Successfully scanned {nb_file} files in {total_time} s")
+            for future in done:
+                add_listing(running.pop(future), future.result())
 
+    return to_parse
+
+
+def _list_dir(
+    path: str, dir_stats: os.stat_result, songs: ingest.Ingest, full: bool
+) -> _Listing | None:
+    """List a directory, and get the stats of its sub directories and music files"""
+    try:
+        with os.scandir(path) as it:
+            entries = list(it)
+    except OSError:
+        return None
+
+    mtime = dir_stats.st_mtime_ns
+    unchanged = not full and songs.is_unchanged_directory(path, mtime, len(entries))
+    listing = _Listing(path, mtime, len(entries), [], [])
+
+    for entry in entries:
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                listing.directories.append((os.path.normpath(entry.path), entry.stat()))
+            elif entry.is_file() and tags.is_music_file(entry.name):
+                file_path = os.path.normpath(entry.path)
+
+                if unchanged and songs.is_known(file_path):
+                    listing.files.append((file_path, None))
+                else:
+                    listing.files.append((file_path, entry.stat()))
+        except OSError:
+            continue
+
+    return listing
+
+
+def get_scan_threads() -> dict[str, int]:
+    """Get the number of threads listing directories for each music directory.
+
+    The SCAN_THREADS setting is a list of "path|threads" separated by ";"."""
+    result: dict[str, int] = {}
+    setting = Setting.get_value(Key.SCAN_THREADS)
+
+    if setting == "":
+        return result
+
+    for item in setting.split(";"):
+        path, threads = item.rsplit("|", 1)
+        result[path] = int(threads)
+
+    return result
+
+
+def _check_file(
+    file_path: str, file_stats: os.stat_result, songs: ingest.Ingest
+) -> tuple[str, int, int] | None:
+    """Returns file path, mtime and size if the file needs to be parsed, else None"""
+    if not tags.is_music_file(file_path):
+        return None
 
-def _scan_file(file_path: str):
-    file_stats = os.stat(file_path)
     file_mtime = int(file_stats.st_mtime)
     file_size = file_stats.st_size
-    stored_mtime = Song.get_file_mtime(file_path)
 
-    if file_mtime != stored_mtime:
-        try:
-            tag = EasyID3(file_path)
-        except ID3NoHeaderError:
-            tag = EasyID3()
+    if songs.check(file_path, file_mtime, file_size):
+        return (file_path, file_mtime, file_size)
 
-        try:
-            _duration = MP3(file_path).info.length
-        except HeaderNotFoundError:
-            _duration = 0
-
-        _album = utils.get_str(tag, "album")
-        _albumartist = utils.get_str(tag, "albumartist")
-        _artist = utils.get_str(tag, "artist")
-        _date = utils.get_year(tag, "date")
-        _disk, _disk_total = utils.get_numbers(tag, "discnumber")
-        _genre = utils.get_str(tag, "genre")
-        _title = utils.get_str(tag, "title", "<unknown>")
-        _track, _track_total = utils.get_numbers(tag, "tracknumber")
-
-        albumartist = Artist.upsert(_albumartist)
-        songartist = Artist.upsert(_artist)
-        genre = Genre.upsert(_genre)
-        album = Album.upsert(_album, albumartist, _date)
-
-        Song.upsert(
-            _track,
-            _track_total,
-            _title,
-            genre,
-            album,
-            _disk,
-            _disk_total,
-            songartist,
-            _date,
-            _duration,
-            file_path,
-            file_mtime,
-            file_size,
-        )
+    return None
+
+
+def _parse_files(
+    to_parse: list[tuple[str, int, int]],
+    workers: int | None,
+    songs: ingest.Ingest,
+    progress: ScanProgress,
+) -> None:
+    if workers is None:
+        workers = int(Setting.get_value(Key.SCAN_WORKERS, "0"))
+
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+
+    progress.start_parsing(len(to_parse))
 
+    def add(data: tags.FileData | tags.FileError) -> None:
+        songs.add(data)
+        progress.parsed += 1
+        progress.parsed_size += data.file_size
+        progress.written = songs.nb_written
+        progress.report()
 
-def get_artists(has_album: bool = False, has_song: bool = False) -> ModelSelect:
+    # files are parsed in worker processes, but only this process writes
+    # imap keeps the order, so the result is the same as a serial scan
+    if workers > 1 and len(to_parse) >= POOL_MIN_FILES:
+        # the workers are started from a fresh interpreter: forking a process
+        # running threads (GUI, player, watcher) can deadlock the children
+        context = multiprocessing.get_context("spawn")
+
+        with context.Pool(workers, tags.init_worker) as pool:
+            for data in pool.imap(tags.try_read_file, to_parse, POOL_CHUNK_SIZE):
+                add(data)
+    else:
+        for file_info in to_parse:
+            add(tags.try_read_file(file_info))
+
+
+@cached
+def get_artists(has_album: bool = False, has_song: bool = False) -> list[Artist]:
     result = Artist.select().distinct()
 
     if has_album:
@@ -112,65 +491,180 @@ def get_artists(has_album: bool = False, has_song: bool = False) -> ModelSelect:
     elif has_song:
         result = result.join(Song)
 
-    return result.order_by(Artist.name)
+    return list(result.order_by(Artist.sort_name))
 
 
-def get_albums(artist: Artist | None = None) -> ModelSelect:
+@cached
+def get_albums(artist: Artist | None = None) -> list[Album]:
     result = Album.select()
 
     if artist is not None:
         result = result.where(Album.artist == artist)
 
-    return result.order_by(Album.year, Album.name)
+    return list(result.order_by(Album.year, Album.sort_name))
 
 
-def get_songs(album: Album | None = None, reverse: bool = False) -> ModelSelect:
-    result = Song.select()
+@cached
+def get_songs(album: Album | None = None, reverse: bool = False) -> list[Song]:
+    result = Song.select_related()
 
     if album is not None:
         result = result.where(Song.album == album)
 
     if reverse:
-        return result.order_by(Song.disk.desc(), Song.track.desc(), Song.name.desc())
+        result = result.order_by(
+            Song.disk.desc(), Song.track.desc(), Song.sort_name.desc()
+        )
     else:
-        return result.order_by(Song.disk, Song.track, Song.name)
+        result = result.order_by(Song.disk, Song.track, Song.sort_name)
+
+    return list(result)
+
+
+def get_library() -> ModelSelect:
+    """Returns the songs having an album artist, with their album, artists and
+    genre, in one query. They are ordered by album artist, album and track,
+    so the songs of an album (and the albums of an artist) follow each other.
+    """
+    return (
+        Song.select_related()
+        .where(AlbumArtist.id.is_null(False))
+        .order_by(
+            AlbumArtist.sort_name,
+            AlbumArtist.id,
+            Album.year,
+            Album.sort_name,
+            Album.id,
+            Song.disk,
+            Song.track,
+            Song.sort_name,
+        )
+    )
+
+
+@cached
+def get_library_rows() -> list[SongRow]:
+    """Same songs as get_library, as read-only rows (faster to read)"""
+    return rows.get_song_rows(get_library())
+
+
+def get_songs_by_ids(song_ids: list[int]) -> list[Song]:
+    """Returns the songs with their album, artists and genre, in the order
+    of the ids. The ids of deleted songs are ignored."""
+    songs: dict[int, Song] = {}
+
+    for chunk in chunked(song_ids, ingest.MAX_VARIABLES):
+        for song in Song.select_related().where(Song.id.in_(chunk)):
+            songs[song.id] = song
 
+    return [songs[song_id] for song_id in song_ids if song_id in songs]
 
-def get_genres() -> ModelSelect:
-    return Genre.select().order_by(Genre.name)
 
+@cached
+def get_genres() -> list[Genre]:
+    return list(Genre.select().order_by(Genre.sort_name))
 
+
+@cached
 def get_years() -> list[str]:
-    years: list[int] = []
-    result: list[str] = []
+    years = Song.select(Song.year).distinct().tuples()
 
-    for song in get_songs():
-        years.append(song.year)
+    return sorted(str(year) for (year,) in years)
 
-    # remove duplicates
-    years = list(set(years))
 
-    # convert to strings
-    result = list(map(str, years))
+@cached
+def get_facet_values(facet: Facet) -> list[FacetValue]:
+    """Returns the values of a facet (artist, genre, year...) having songs,
+    with their number of songs"""
+    return facets.get_values(facet)
 
-    result.sort()
 
-    return result
+@cached
+def get_facet_song_ids(facet: Facet, value: int | None) -> set[int]:
+    """Returns the ids of the songs having the value of a facet"""
+    return facets.get_song_ids(facet, value)
+
+
+def search(text: str, limit: int | None = None, ranked: bool = True) -> list[int]:
+    """Returns the ids of the songs matching all the words of the text
+    (accents and case are ignored, words match by prefix), the most relevant
+    first if ranked.
+
+    Not cached: each prefix typed in the search bar would keep its list of
+    ids, a large part of the library for short prefixes."""
+    return fts.search(text, limit, ranked)
 
 
+@cached
 def has_songs() -> bool:
-    return Song.select().count() != 0
+    return Song.select().exists()
+
+
+def get_cache_stats() -> dict[str, int]:
+    """Returns the generation, size, hits and misses of the query cache"""
+    return query_cache.get_stats()
+
+
+def get_stats() -> dict[str, int | float]:
+    # the totals are stored by artist, only the songs without artist are summed
+    by_artist = (
+        Artist.select(
+            fn.SUM(Artist.nb_songs), fn.SUM(Artist.duration), fn.SUM(Artist.size)
+        )
+        .tuples()
+        .get()
+    )
+    without_artist = (
+        Song.select(fn.COUNT(Song.id), fn.SUM(Song.duration), fn.SUM(Song.file_size))
+        .where(Song.artist.is_null())
+        .tuples()
+        .get()
+    )
+    nb_songs, duration, size = (
+        (total or 0) + (other or 0) for total, other in zip(by_artist, without_artist)
+    )
+
+    return {
+        "songs": nb_songs,
+        "albums": Album.select().count(),
+        "artists": Artist.select().count(),
+        "genres": Genre.select().count(),
+        "bad_files": BadFile.select().count(),
+        "duration": duration,
+        "size": size,
+    }
 
 
 def print_stats() -> None:
-    duration = Song.select(fn.SUM(Song.duration)).scalar()
-    duration_days = timedelta(seconds=duration)
-    size = Song.select(fn.SUM(Song.file_size)).scalar()
-    size_gb = round(size / (1024**3), 2)
-
-    print("Songs :", Song.select().count())
-    print("Albums :", Album.select().count())
-    print("Artists :", Artist.select().count())
-    print("Genres :", Genre.select().count())
-    print(f"duration : {duration} - {duration_days}")
-    print(f"size : {size} - {size_gb} GB")
+    stats = get_stats()
+    duration_days = timedelta(seconds=stats["duration"])
+    size_gb = round(stats["size"] / (1024**3), 2)
+
+    print("Songs :", stats["songs"])
+    print("Albums :", stats["albums"])
+    print("Artists :", stats["artists"])
+    print("Genres :", stats["genres"])
+    print(f"duration : {stats['duration']} - {duration_days}")
+    print(f"size : {stats['size']} - {size_gb} GB")
+
+
+def verify() -> dict[str, list]:
+    """Check the database file, and the files of the songs.
+
+    Returns:
+        dict[str, list]: the problems found: "integrity" (messages of SQLite,
+            empty if the file is fine), "missing_files" (songs whose file does
+            not exist) and "bad_files" ((path, error) of the files that could
+            not be parsed)
+    """
+    integrity = [row[0] for row in db.db.execute_sql("PRAGMA integrity_check;")]
+
+    return {
+        "integrity": [] if integrity == ["ok"] else integrity,
+        "missing_files": [
+            file_path
+            for (file_path,) in Song.select(Song.file_path).tuples()
+            if not os.path.isfile(file_path)
+        ],
+        "bad_files": list(BadFile.select(BadFile.file_path, BadFile.error).tuples()),
+    }
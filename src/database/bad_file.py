@@ -0,0 +1,15 @@
+import peewee
+
+from .base_model import BaseModel
+
+
+class BadFile(BaseModel):
+    """Files that could not be parsed. They are skipped until they change."""
+
+    file_path = peewee.CharField(unique=True)
+    file_mtime = peewee.IntegerField()
+    file_size = peewee.IntegerField()
+    error = peewee.CharField()
+
+    def __str__(self) -> str:
+        return f"{self.file_path}: {self.error}"
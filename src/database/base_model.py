@@ -1,9 +1,30 @@
 import peewee
+from playhouse.migrate import SqliteMigrator, migrate
 
 DATABASE_FILE = "library.db"
 
+# free pages are given back to the file system above this part of the pages
+FREELIST_RATIO = 0.1
 
-db = peewee.SqliteDatabase(DATABASE_FILE)
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+# set on the connection of each thread (GUI, player, scan, watcher...)
+# with WAL, reading threads are not blocked by a scan writing songs
+# and the database is not corrupted by a crash
+# auto_vacuum comes first: switching to WAL writes the header of a new file,
+# after which the mode can only be changed by a VACUUM
+PRAGMAS = {
+    "auto_vacuum": AUTO_VACUUM_INCREMENTAL,
+    "journal_mode": "wal",
+    "synchronous": "normal",
+    "cache_size": -16 * 1024,  # in KiB when negative
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "memory",
+}
+
+# peewee opens one connection per thread
+db = peewee.SqliteDatabase(DATABASE_FILE, pragmas=PRAGMAS)
 
 
 class BaseModel(peewee.Model):
@@ -13,10 +34,64 @@ class BaseModel(peewee.Model):
 
 def init(models) -> None:
     db.connect()
-    db.create_tables(models)
-    db.execute_sql("PRAGMA journal_mode = off;")
-    db.execute_sql("PRAGMA synchronous = 0;")
+    _enable_incremental_vacuum()
+    # existing tables get their new indexes from the migrations
+    db.create_tables([model for model in models if not model.table_exists()])
+    _add_columns(models)
+
+
+def _add_columns(models) -> None:
+    """Add the new (nullable) columns of the models to existing tables.
+
+    Columns are never dropped here: an older version may still use them,
+    removing a column is done by a migration."""
+    migrator = SqliteMigrator(db)
+
+    for model in models:
+        table = model._meta.table_name
+        fields = {field.column_name: field for field in model._meta.sorted_fields}
+        columns = [column.name for column in db.get_columns(table)]
+
+        for name, field in fields.items():
+            if name not in columns:
+                migrate(migrator.add_column(table, name, field))
+
+
+def _enable_incremental_vacuum() -> None:
+    """Keep track of the free pages, so they can be released without VACUUM"""
+    if db.execute_sql("PRAGMA auto_vacuum;").fetchone()[0] == AUTO_VACUUM_INCREMENTAL:
+        return
+
+    db.execute_sql(f"PRAGMA auto_vacuum = {AUTO_VACUUM_INCREMENTAL};")
+
+    # an existing database needs to be rebuilt once to change the mode
+    if len(db.get_tables()) > 0:
+        vacuum()
+
+
+def incremental_vacuum() -> int:
+    """Release the free pages if they are more than FREELIST_RATIO of the file.
+
+    Returns:
+        int: the number of released pages
+    """
+    free_pages = db.execute_sql("PRAGMA freelist_count;").fetchone()[0]
+    pages = db.execute_sql("PRAGMA page_count;").fetchone()[0]
+
+    if free_pages == 0 or free_pages < pages * FREELIST_RATIO:
+        return 0
+
+    # sqlite3 steps a pragma only once, releasing one page, a script runs it fully
+    db.connection().executescript("PRAGMA incremental_vacuum;")
+
+    return free_pages
+
+
+def set_pragma(name: str, value: str) -> None:
+    """Change a pragma for the current connection, and the next ones"""
+    db.pragma(name, value, permanent=True)
 
 
 def vacuum() -> None:
+    """Rebuild the whole database file"""
     db.execute_sql("VACUUM;")
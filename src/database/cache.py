@@ -0,0 +1,83 @@
+"""Cache of query results, so reading the library again costs no query.
+
+The library only changes when it is scanned: each scan increments the
+generation of the cache, which forgets the results of the previous one."""
+
+import functools
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from typing import Any, ParamSpec, TypeVar
+
+# number of results kept, the least recently used are forgotten first
+MAX_SIZE = 512
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+
+class QueryCache:
+    """Least recently used results, valid for one generation of the library"""
+
+    def __init__(self, max_size: int = MAX_SIZE) -> None:
+        self.max_size = max_size
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.results: OrderedDict[Hashable, Any] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: Hashable, compute: Callable[[], R]) -> R:
+        """Returns the cached result of the key, or computes and caches it"""
+        with self.lock:
+            if key in self.results:
+                self.results.move_to_end(key)
+                self.hits += 1
+                return self.results[key]
+
+            self.misses += 1
+            generation = self.generation
+
+        result = compute()
+
+        with self.lock:
+            # don't keep a result read while the library was changing
+            if generation == self.generation:
+                self.results[key] = result
+
+                if len(self.results) > self.max_size:
+                    self.results.popitem(last=False)
+
+        return result
+
+    def invalidate(self) -> None:
+        """Start a new generation, when the library changed"""
+        with self.lock:
+            self.generation += 1
+            self.results.clear()
+
+    def get_stats(self) -> dict[str, int]:
+        with self.lock:
+            return {
+                "generation": self.generation,
+                "size": len(self.results),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+query_cache = QueryCache()
+
+
+def cached(function: Callable[P, R]) -> Callable[P, R]:
+    """Cache the results of a function reading the library, by arguments.
+
+    The results are shared between the calls: they must not be modified."""
+
+    @functools.wraps(function)
+    def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+        key = (function.__qualname__, args, tuple(sorted(kwargs.items())))
+        return query_cache.get(key, lambda: function(*args, **kwargs))
+
+    return wrapper
@@ -0,0 +1,12 @@
+import peewee
+
+from .base_model import BaseModel
+
+
+class Directory(BaseModel):
+    path = peewee.CharField(unique=True)
+    mtime = peewee.IntegerField()
+    nb_entries = peewee.IntegerField()
+
+    def __str__(self) -> str:
+        return f"{self.path}"
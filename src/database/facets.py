@@ -0,0 +1,116 @@
+"""Facets to filter songs: the values of a song property, with their number
+of songs, counted by SQLite.
+
+A selected value is applied as a SQL predicate on the songs, using the
+indexes of the song and album tables."""
+
+import enum
+from typing import NamedTuple
+
+from peewee import Expression, fn
+
+from .album import Album
+from .artist import Artist
+from .genre import Genre
+from .song import Song
+
+
+class Facet(enum.StrEnum):
+    ALBUM_ARTIST = "Album Artist"
+    SONG_ARTIST = "Song Artist"
+    GENRE = "Genre"
+    DECADE = "Decade"
+    YEAR = "Year"
+
+
+class FacetValue(NamedTuple):
+    facet: Facet
+    # artist or genre id, year or first year of the decade, None if unknown
+    value: int | None
+    label: str
+    count: int
+
+
+UNKNOWN = "Unknown"
+
+DECADE = (Song.year / 10) * 10
+
+
+def get_values(facet: Facet) -> list[FacetValue]:
+    """Returns the values of a facet, with their number of songs.
+
+    Args:
+        facet (Facet): the song property
+
+    Returns:
+        list[FacetValue]: the values having songs, sorted by name or by date
+    """
+    count = fn.COUNT(Song.id)
+
+    if facet == Facet.ALBUM_ARTIST:
+        query = (
+            Song.select(Album.artist, Artist.name, count)
+            .join(Album)
+            .join(Artist, on=(Album.artist == Artist.id))
+            .group_by(Album.artist)
+            .order_by(Artist.sort_name)
+        )
+    elif facet == Facet.SONG_ARTIST:
+        query = (
+            Song.select(Song.artist, Artist.name, count)
+            .join(Artist, on=(Song.artist == Artist.id))
+            .group_by(Song.artist)
+            .order_by(Artist.sort_name)
+        )
+    elif facet == Facet.GENRE:
+        query = (
+            Song.select(Song.genre, Genre.name, count)
+            .join(Genre)
+            .group_by(Song.genre)
+            .order_by(Genre.sort_name)
+        )
+    else:
+        date = Song.year if facet == Facet.YEAR else DECADE
+        suffix = "" if facet == Facet.YEAR else "s"
+
+        return [
+            FacetValue(facet, value, _get_date_label(value, suffix), nb_songs)
+            for value, nb_songs in Song.select(date, count)
+            .group_by(date)
+            .order_by(date.asc(nulls="LAST"))
+            .tuples()
+        ]
+
+    return [
+        FacetValue(facet, value, str(name), nb_songs)
+        for value, name, nb_songs in query.tuples()
+    ]
+
+
+def get_predicate(facet: Facet, value: int | None) -> Expression:
+    """Returns the condition on Song selecting the songs having a facet value"""
+    if facet == Facet.ALBUM_ARTIST:
+        albums = Album.select(Album.id).where(Album.artist == value)
+        return Song.album.in_(albums)
+    elif facet == Facet.DECADE and value is not None:
+        return Song.year.between(value, value + 9)
+
+    field = {
+        Facet.SONG_ARTIST: Song.artist,
+        Facet.GENRE: Song.genre,
+        Facet.DECADE: Song.year,
+        Facet.YEAR: Song.year,
+    }[facet]
+
+    return field.is_null() if value is None else field == value
+
+
+def get_song_ids(facet: Facet, value: int | None) -> set[int]:
+    """Returns the ids of the songs having a facet value"""
+    query = Song.select(Song.id).where(get_predicate(facet, value)).tuples()
+
+    return {song_id for (song_id,) in query}
+
+
+def _get_date_label(value: int | None, suffix: str) -> str:
+    return UNKNOWN if value is None else f"{value}{suffix}"
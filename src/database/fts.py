@@ -0,0 +1,104 @@
+"""Full text search of songs, with a SQLite FTS5 table.
+
+The table is updated by the scan when songs are written or deleted.
+Accents and case are ignored, and words match by prefix."""
+
+from peewee import chunked
+
+from .base_model import db
+
+MAX_VARIABLES = 900
+
+# relative weight of each column in the ranking
+COLUMNS = {
+    "name": 10.0,
+    "artist": 5.0,
+    "album": 5.0,
+    "albumartist": 3.0,
+    "genre": 2.0,
+    "year": 1.0,
+}
+
+# values of the columns, for some songs
+SELECT_SONGS = (
+    "SELECT song.id, song.name, artist.name, album.name, albumartist.name, "
+    "genre.name, song.year FROM song "
+    "LEFT JOIN artist ON artist.id = song.artist_id "
+    "LEFT JOIN album ON album.id = song.album_id "
+    "LEFT JOIN artist AS albumartist ON albumartist.id = album.artist_id "
+    "LEFT JOIN genre ON genre.id = song.genre_id"
+)
+
+
+def create_table() -> None:
+    db.execute_sql(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS song_search USING fts5("
+        f"{', '.join(COLUMNS)}, "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '1 2 3');"
+    )
+
+
+def rebuild() -> None:
+    """Index all the songs again"""
+    db.execute_sql("DELETE FROM song_search;")
+    db.execute_sql(
+        f"INSERT INTO song_search (rowid, {', '.join(COLUMNS)}) {SELECT_SONGS};"
+    )
+
+
+def index_files(file_paths: list[str]) -> None:
+    """Index (again) the songs of these files"""
+    for chunk in chunked(file_paths, MAX_VARIABLES):
+        parameters = ",".join("?" * len(chunk))
+        song_ids = f"SELECT id FROM song WHERE file_path IN ({parameters})"
+
+        db.execute_sql(f"DELETE FROM song_search WHERE rowid IN ({song_ids});", chunk)
+        db.execute_sql(
+            f"INSERT INTO song_search (rowid, {', '.join(COLUMNS)}) "
+            f"{SELECT_SONGS} WHERE song.file_path IN ({parameters});",
+            chunk,
+        )
+
+
+def delete_songs(song_ids: list[int]) -> None:
+    for chunk in chunked(song_ids, MAX_VARIABLES):
+        parameters = ",".join("?" * len(chunk))
+        db.execute_sql(f"DELETE FROM song_search WHERE rowid IN ({parameters});", chunk)
+
+
+def search(text: str, limit: int | None = None, ranked: bool = True) -> list[int]:
+    """Returns the ids of the songs matching all the words of the text,
+    the most relevant first.
+
+    Args:
+        text (str): the searched words, matching the start of words of the
+            name, artist, album, album artist, genre or year of the songs
+        limit (int | None, optional): maximum number of results
+        ranked (bool, optional): sort the results by relevance. Ranking
+            costs more than the search itself for short words
+
+    Returns:
+        list[int]: the song ids
+    """
+    query = get_query(text)
+
+    if query == "":
+        return []
+
+    sql = "SELECT rowid FROM song_search WHERE song_search MATCH ?"
+
+    if ranked:
+        weights = ", ".join(str(weight) for weight in COLUMNS.values())
+        sql += f" ORDER BY bm25(song_search, {weights})"
+
+    if limit is not None:
+        sql += f" LIMIT {int(limit)}"
+
+    return [row[0] for row in db.execute_sql(sql, [query])]
+
+
+def get_query(text: str) -> str:
+    """Convert text to a FTS5 query, where each word is a quoted prefix"""
+    words = text.replace('"', " ").split()
+
+    return " ".join(f'"{word}"*' for word in words)
@@ -0,0 +1,197 @@
+"""Fast reading of the ID3v2.3/2.4 tags of MP3 files.
+
+Only the text frames used by the database are decoded. The other frames,
+like pictures, are skipped without being read: the file is memory mapped,
+so only the pages of the needed frames are loaded.
+
+Tags that are not simple (unsynchronisation, compressed frames, ID3v1,
+numeric genres...) are not handled, mutagen must be used instead."""
+
+import mmap
+import re
+import struct
+from typing import BinaryIO
+
+from mutagen.mp3 import HeaderNotFoundError, MPEGInfo
+
+# frame id => EasyID3 key
+TEXT_FRAMES = {
+    "TIT2": "title",
+    "TPE1": "artist",
+    "TPE2": "albumartist",
+    "TALB": "album",
+    "TCON": "genre",
+    "TDRC": "date",
+    "TYER": "date",
+    "TRCK": "tracknumber",
+    "TPOS": "discnumber",
+}
+
+# ID3v2.3 frames that mutagen merges with the date
+DATE_FRAMES = {"TDAT", "TIME"}
+
+HEADER = struct.Struct(">3sBBBL")
+FRAME_HEADER = struct.Struct(">4sLH")
+
+# compression, encryption, grouping, unsynchronisation and data length flags
+FRAME_FLAGS = {3: 0x00E0, 4: 0x004F}
+
+ENCODINGS = {0: "latin-1", 1: "utf-16", 2: "utf-16-be", 3: "utf-8"}
+
+FRAME_ID = re.compile(rb"[A-Z0-9]{4}")
+# dates that mutagen and get_year read the same way
+SIMPLE_DATE = re.compile(r"\d{4}(-\d{2}-\d{2})?")
+# genres given as ID3v1 genre numbers, translated by mutagen
+NUMERIC_GENRE = re.compile(r"\d+|RX|CR|.*\(.*")
+
+
+class Unsupported(Exception):
+    pass
+
+
+def read_mp3(file: BinaryIO) -> tuple[dict[str, list[str]], MPEGInfo | None] | None:
+    """Read the tags and stream info of a MP3 file.
+
+    Args:
+        file (BinaryIO): the file, opened in binary mode
+
+    Returns:
+        tuple[dict[str, list[str]], MPEGInfo | None] | None: the tags with the
+            same keys as EasyID3, and the stream info if an audio stream is
+            found. None if mutagen must be used instead.
+    """
+    try:
+        with (
+            mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data,
+            memoryview(data) as view,
+        ):
+            tags, tag_size = read_tags(view)
+    except (Unsupported, ValueError, OSError):
+        return None
+
+    # as with mutagen, a file without audio stream keeps its tags
+    try:
+        info = MPEGInfo(file, tag_size)
+    except HeaderNotFoundError:
+        info = None
+
+    return (tags, info)
+
+
+def read_tags(data: memoryview) -> tuple[dict[str, list[str]], int]:
+    """Returns the text tags, and the size of the ID3v2 tag"""
+    if len(data) < HEADER.size:
+        raise Unsupported()
+
+    magic, version, _, flags, size = HEADER.unpack_from(data)
+
+    # ID3v1 tags at the end of the file are merged by mutagen
+    if magic != b"ID3" or version not in (3, 4) or data[-128:-125] == b"TAG":
+        raise Unsupported()
+
+    # unsynchronisation, extended header, or flags that mutagen does not accept
+    if flags & 0xC0 or flags & (0x0F if version == 4 else 0x1F):
+        raise Unsupported()
+
+    tag_size = _synchsafe(size) + HEADER.size
+    offset = HEADER.size
+
+    if tag_size > len(data):
+        raise Unsupported()
+
+    result: dict[str, list[str]] = {}
+    frame_ids: set[str] = set()
+
+    while offset + FRAME_HEADER.size <= tag_size:
+        frame_id, frame_size, frame_flags = FRAME_HEADER.unpack_from(data, offset)
+        offset += FRAME_HEADER.size
+
+        # padding
+        if frame_id.strip(b"\0") == b"":
+            break
+
+        if FRAME_ID.fullmatch(frame_id) is None:
+            raise Unsupported()
+
+        if version == 4:
+            frame_size = _synchsafe(frame_size)
+
+        if offset + frame_size > tag_size:
+            raise Unsupported()
+
+        name = frame_id.decode("ascii")
+
+        # duplicate frames are merged by mutagen, and ID3v2.3 dates converted
+        if name in frame_ids or name in DATE_FRAMES:
+            raise Unsupported()
+
+        if version == 4 and name == "TYER":
+            raise Unsupported()
+
+        frame_ids.add(name)
+        key = TEXT_FRAMES.get(name)
+
+        if key is not None and frame_size > 0:
+            if key in result or frame_flags & FRAME_FLAGS[version]:
+                raise Unsupported()
+
+            result[key] = _read_text(bytes(data[offset : offset + frame_size]))
+
+        offset += frame_size
+
+    for value in result.get("date", []):
+        if SIMPLE_DATE.fullmatch(value) is None:
+            raise Unsupported()
+
+    for value in result.get("genre", []):
+        if NUMERIC_GENRE.fullmatch(value) is not None:
+            raise Unsupported()
+
+    return (result, tag_size)
+
+
+def _read_text(frame: bytes) -> list[str]:
+    encoding = ENCODINGS.get(frame[0])
+
+    if encoding is None:
+        raise Unsupported()
+
+    raw = frame[1:]
+
+    # values are separated by a null character, of 2 bytes in UTF-16
+    if frame[0] in (1, 2):
+        parts: list[bytes] = []
+        start = 0
+
+        for i in range(0, len(raw) - 1, 2):
+            if raw[i : i + 2] == b"\0\0":
+                parts.append(raw[start:i])
+                start = i + 2
+
+        parts.append(raw[start:])
+    else:
+        parts = raw.split(b"\0")
+
+    # the last value may end with a null character
+    if len(parts) > 1 and parts[-1] == b"":
+        parts.pop()
+
+    try:
+        result = [part.decode(encoding) for part in parts]
+    except UnicodeDecodeError:
+        raise Unsupported() from None
+
+    if len(result) == 0 or result == [""]:
+        raise Unsupported()
+
+    return result
+
+
+def _synchsafe(value: int) -> int:
+    """Decode a 28 bits integer stored on 4 bytes of 7 bits"""
+    return (
+        (value & 0x7F000000) >> 3
+        | (value & 0x007F0000) >> 2
+        | (value & 0x00007F00) >> 1
+        | (value & 0x0000007F)
+    )
@@ -0,0 +1,586 @@
+"""Bulk insertion of scanned files in the database"""
+
+import os
+
+from peewee import chunked, fn
+
+from . import base_model as db
+from . import fts, utils
+from .album import Album
+from .artist import Artist
+from .bad_file import BadFile
+from .directory import Directory
+from .genre import Genre
+from .song import Song
+from .tags import FileData, FileError, hash_file
+
+BATCH_SIZE = 500
+
+# keep the number of SQL variables per statement under SQLite limit (999)
+MAX_VARIABLES = 900
+
+SONG_FIELDS = [
+    Song.track,
+    Song.track_total,
+    Song.name,
+    Song.sort_name,
+    Song.genre,
+    Song.album,
+    Song.disk,
+    Song.disk_total,
+    Song.artist,
+    Song.year,
+    Song.duration,
+    Song.bitrate,
+    Song.sample_rate,
+    Song.channels,
+    Song.file_path,
+    Song.file_mtime,
+    Song.file_size,
+    Song.file_hash,
+]
+
+# totals of the songs of albums and artists
+ALBUM_AGGREGATES = (
+    "UPDATE album SET (nb_songs, duration, size, year, last_year) = ("
+    "SELECT COUNT(*), IFNULL(SUM(duration), 0), IFNULL(SUM(file_size), 0), "
+    "MIN(year), MAX(year) FROM song WHERE song.album_id = album.id)"
+)
+ARTIST_AGGREGATES = (
+    "UPDATE artist SET (nb_songs, duration, size, first_year, last_year) = ("
+    "SELECT COUNT(*), IFNULL(SUM(duration), 0), IFNULL(SUM(file_size), 0), "
+    "MIN(year), MAX(year) FROM song WHERE song.artist_id = artist.id)"
+)
+
+
+class Ingest:
+    """Insert or update songs by batches.
+
+    Artists, genres and albums ids are kept in memory, so adding a song
+    only costs SQL queries when the batch is flushed, in one transaction.
+    Known files are also kept in memory, so checking if a file changed
+    does not cost any SQL query.
+
+    Each flush is a checkpoint: if the scan is interrupted, the written songs
+    and the directories whose files are all written are not checked again.
+    """
+
+    def __init__(self, batch_size: int = BATCH_SIZE) -> None:
+        self.batch_size = batch_size
+        self.pending: list[FileData | FileError] = []
+
+        # file path => (song id, mtime, size)
+        self.files: dict[str, tuple[int, int, int]] = {
+            file_path: (song_id, file_mtime, file_size)
+            for song_id, file_path, file_mtime, file_size in Song.select(
+                Song.id, Song.file_path, Song.file_mtime, Song.file_size
+            ).tuples()
+        }
+        # songs written before their partial hash was stored
+        self.unhashed: set[str] = {
+            file_path
+            for (file_path,) in Song.select(Song.file_path)
+            .where(Song.file_hash.is_null())
+            .tuples()
+        }
+        # paths of the files found during the scan
+        self.seen: set[str] = set()
+        self.nb_moved = 0
+
+        # directory path => (mtime, number of entries)
+        self.directories: dict[str, tuple[int, int]] = {
+            path: (mtime, nb_entries)
+            for path, mtime, nb_entries in Directory.select(
+                Directory.path, Directory.mtime, Directory.nb_entries
+            ).tuples()
+        }
+        # directories found during the scan
+        self.seen_directories: dict[str, tuple[int, int]] = {}
+        # directory path => number of its files not written yet
+        # only set during a scan, directories are not saved otherwise
+        self.pending_directories: dict[str, int] | None = None
+
+        # file path => (mtime, size) of the files that could not be parsed
+        self.bad_files: dict[str, tuple[int, int]] = {
+            file_path: (file_mtime, file_size)
+            for file_path, file_mtime, file_size in BadFile.select(
+                BadFile.file_path, BadFile.file_mtime, BadFile.file_size
+            ).tuples()
+        }
+        self.nb_errors = 0
+        self.nb_written = 0
+
+        self.artists: dict[str, int] = dict(
+            Artist.select(Artist.name, Artist.id).tuples()
+        )
+        self.genres: dict[str, int] = dict(Genre.select(Genre.name, Genre.id).tuples())
+        self.albums: dict[tuple[str, int | None], int] = {
+            (name, artist_id): album_id
+            for album_id, name, artist_id in Album.select(
+                Album.id, Album.name, Album.artist
+            ).tuples()
+        }
+
+    def check(self, file_path: str, file_mtime: int, file_size: int) -> bool:
+        """Mark the file as seen, and returns True if it is new or changed.
+        Files that could not be parsed are ignored until they change."""
+        self.seen.add(file_path)
+
+        if self.bad_files.get(file_path) == (file_mtime, file_size):
+            return False
+
+        known = self.files.get(file_path)
+
+        return known is None or known[1:] != (file_mtime, file_size)
+
+    def is_known(self, file_path: str) -> bool:
+        return file_path in self.files
+
+    def mark_seen(self, file_path: str) -> None:
+        """Mark a known file as seen without checking it"""
+        self.seen.add(file_path)
+
+    def is_unchanged_directory(self, path: str, mtime: int, nb_entries: int) -> bool:
+        """Returns True if the directory listing is the same as during the last scan"""
+        return self.directories.get(path) == (mtime, nb_entries)
+
+    def add_directory(self, path: str, mtime: int, nb_entries: int) -> None:
+        """Mark the directory as seen"""
+        self.seen_directories[path] = (mtime, nb_entries)
+
+    def keep(self, path: str) -> None:
+        """Mark the known files and directories inside a path as seen,
+        so they are kept even if the path can't be scanned"""
+        for file_path in self.files:
+            if is_in(file_path, [path]):
+                self.seen.add(file_path)
+
+        for file_path in self.bad_files:
+            if is_in(file_path, [path]):
+                self.seen.add(file_path)
+
+        for directory, state in self.directories.items():
+            if is_in(directory, [path]):
+                self.seen_directories[directory] = state
+
+    def add(self, data: FileData | FileError) -> None:
+        self.pending.append(data)
+
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if len(self.pending) == 0:
+            return
+
+        with db.db.atomic():
+            self._write(self.pending)
+
+        self.pending = []
+
+    def sweep(self, paths: list[str] | None = None) -> int:
+        """Delete the known songs that were not seen during the scan,
+        then the albums, artists and genres without songs.
+        The missing bad files are forgotten too.
+
+        Args:
+            paths (list[str] | None, optional): if set, only the songs
+                in these files or directories can be deleted
+
+        Returns:
+            int: the number of deleted songs
+        """
+        missing = list(self._get_missing(paths).values())
+        missing_bad_files = [
+            file_path
+            for file_path in self.bad_files
+            if file_path not in self.seen and (paths is None or is_in(file_path, paths))
+        ]
+
+        with db.db.atomic():
+            albums, artists = get_owners(missing)
+
+            for chunk in chunked(missing, MAX_VARIABLES):
+                Song.delete().where(Song.id.in_(chunk)).execute()
+
+            fts.delete_songs(missing)
+
+            for chunk in chunked(missing_bad_files, MAX_VARIABLES):
+                BadFile.delete().where(BadFile.file_path.in_(chunk)).execute()
+
+            delete_orphans()
+            update_aggregates(albums, artists)
+
+        return len(missing)
+
+    def find_moves(
+        self, to_parse: list[tuple[str, int, int]], paths: list[str] | None = None
+    ) -> list[tuple[str, int, int]]:
+        """Find the new files that are known songs moved since the last scan,
+        by comparing their size and partial hash with the missing songs.
+
+        Moved songs keep their id, only their path is updated.
+
+        Args:
+            to_parse (list[tuple[str, int, int]]): path, mtime and size of
+                the new and changed files
+            paths (list[str] | None, optional): if set, only the songs
+                in these files or directories can be moved
+
+        Returns:
+            list[tuple[str, int, int]]: the files that still need to be parsed
+        """
+        missing = list(self._get_missing(paths).values())
+
+        # (size, hash) => missing songs (id, path)
+        candidates: dict[tuple[int, str], list[tuple[int, str]]] = {}
+
+        for chunk in chunked(missing, MAX_VARIABLES):
+            for song_id, file_path, file_size, file_hash in (
+                Song.select(Song.id, Song.file_path, Song.file_size, Song.file_hash)
+                .where(Song.id.in_(chunk), Song.file_hash.is_null(False))
+                .tuples()
+            ):
+                candidates.setdefault((file_size, file_hash), []).append(
+                    (song_id, file_path)
+                )
+
+        sizes = {file_size for file_size, _ in candidates}
+        moved: list[tuple[int, str, int]] = []
+        result: list[tuple[str, int, int]] = []
+
+        for file_info in to_parse:
+            file_path, file_mtime, file_size = file_info
+
+            if file_path in self.files or file_size not in sizes:
+                result.append(file_info)
+                continue
+
+            try:
+                with open(file_path, "rb") as file:
+                    file_hash = hash_file(file, file_size)
+            except OSError:
+                result.append(file_info)
+                continue
+
+            songs = candidates.get((file_size, file_hash))
+
+            if not songs:
+                result.append(file_info)
+                continue
+
+            song_id, old_path = songs.pop()
+            moved.append((song_id, file_path, file_mtime))
+
+            del self.files[old_path]
+            self.files[file_path] = (song_id, file_mtime, file_size)
+
+        with db.db.atomic():
+            for song_id, file_path, file_mtime in moved:
+                Song.update(file_path=file_path, file_mtime=file_mtime).where(
+                    Song.id == song_id
+                ).execute()
+
+        self.nb_moved += len(moved)
+
+        return result
+
+    def add_unhashed(
+        self, to_parse: list[tuple[str, int, int]]
+    ) -> list[tuple[str, int, int]]:
+        """Add the seen songs without partial hash to the files to parse,
+        even if they did not change, so their hash is stored once.
+        Their stream info (bitrate, sample rate, channels) is stored too:
+        songs from before the hash were also written before the stream info.
+        Files that could not be parsed are ignored until they change.
+
+        Args:
+            to_parse (list[tuple[str, int, int]]): path, mtime and size of
+                the new and changed files
+
+        Returns:
+            list[tuple[str, int, int]]: the files to parse
+        """
+        queued = {file_path for file_path, _, _ in to_parse}
+
+        return to_parse + [
+            (file_path, *self.files[file_path][1:])
+            for file_path in sorted(self.unhashed)
+            if file_path in self.seen
+            and file_path not in queued
+            and self.bad_files.get(file_path) != self.files[file_path][1:]
+        ]
+
+    def start_checkpoints(self, to_parse: list[tuple[str, int, int]]) -> None:
+        """Save the directories without files to parse, and the other ones
+        when all their files are written."""
+        self.pending_directories = {}
+
+        for file_path, _, _ in to_parse:
+            directory = os.path.dirname(file_path)
+            self.pending_directories[directory] = (
+                self.pending_directories.get(directory, 0) + 1
+            )
+
+        with db.db.atomic():
+            self._save_directories(
+                [
+                    path
+                    for path in self.seen_directories
+                    if path not in self.pending_directories
+                ]
+            )
+
+    def save_directories(self, paths: list[str] | None = None) -> None:
+        """Store the directories seen during the scan, and forget the other ones.
+
+        Args:
+            paths (list[str] | None, optional): if set, only the directories
+                in these paths can be forgotten
+        """
+        missing = [
+            path
+            for path in self.directories
+            if path not in self.seen_directories
+            and (paths is None or is_in(path, paths))
+        ]
+
+        with db.db.atomic():
+            self._save_directories(list(self.seen_directories))
+
+            for chunk in chunked(missing, MAX_VARIABLES):
+                Directory.delete().where(Directory.path.in_(chunk)).execute()
+
+    def _save_directories(self, paths: list[str]) -> None:
+        changed = []
+
+        for path in paths:
+            state = self.seen_directories[path]
+
+            if self.directories.get(path) != state:
+                changed.append((path, *state))
+                self.directories[path] = state
+
+        for chunk in chunked(changed, MAX_VARIABLES // 3):
+            Directory.insert_many(
+                chunk,
+                fields=[Directory.path, Directory.mtime, Directory.nb_entries],
+            ).on_conflict(
+                conflict_target=[Directory.path],
+                preserve=[Directory.mtime, Directory.nb_entries],
+            ).execute()
+
+    def _get_missing(self, paths: list[str] | None) -> dict[str, int]:
+        """Returns path => song id of the known files not seen during the scan"""
+        return {
+            file_path: song_id
+            for file_path, (song_id, _, _) in self.files.items()
+            if file_path not in self.seen and (paths is None or is_in(file_path, paths))
+        }
+
+    def _write(self, batch: list[FileData | FileError]) -> None:
+        rows: list[tuple] = []
+        errors: list[FileError] = []
+
+        # the totals of the albums and artists of the songs, before and after
+        # the update, must be computed again
+        albums, artists = get_owners(
+            [
+                self.files[data.file_path][0]
+                for data in batch
+                if isinstance(data, FileData) and data.file_path in self.files
+            ]
+        )
+
+        for data in batch:
+            if isinstance(data, FileError):
+                print(f"Cannot parse {data.file_path}: {data.error}")
+                errors.append(data)
+                continue
+
+            albumartist = self._get_artist(data.albumartist)
+            songartist = self._get_artist(data.artist)
+            genre = self._get_genre(data.genre)
+            album = self._get_album(data.album, albumartist, data.year)
+
+            if album is not None:
+                albums.add(album)
+
+            if songartist is not None:
+                artists.add(songartist)
+
+            rows.append(
+                (
+                    data.track,
+                    data.track_total,
+                    data.title,
+                    utils.get_sort_key(data.title),
+                    genre,
+                    album,
+                    data.disk,
+                    data.disk_total,
+                    songartist,
+                    data.year,
+                    data.duration,
+                    data.bitrate,
+                    data.sample_rate,
+                    data.channels,
+                    data.file_path,
+                    data.file_mtime,
+                    data.file_size,
+                    data.file_hash,
+                )
+            )
+
+        for chunk in chunked(rows, MAX_VARIABLES // len(SONG_FIELDS)):
+            Song.insert_many(chunk, fields=SONG_FIELDS).on_conflict(
+                conflict_target=[Song.file_path],
+                preserve=[f for f in SONG_FIELDS if f is not Song.file_path],
+            ).execute()
+
+        fts.index_files(
+            [data.file_path for data in batch if isinstance(data, FileData)]
+        )
+        update_aggregates(albums, artists)
+
+        # parsed files are not bad anymore, and new bad files are stored
+        fixed = [data.file_path for data in batch if data.file_path in self.bad_files]
+
+        for chunk in chunked(fixed, MAX_VARIABLES):
+            BadFile.delete().where(BadFile.file_path.in_(chunk)).execute()
+
+        for chunk in chunked(errors, MAX_VARIABLES // 4):
+            BadFile.insert_many(
+                chunk,
+                fields=[
+                    BadFile.file_path,
+                    BadFile.file_mtime,
+                    BadFile.file_size,
+                    BadFile.error,
+                ],
+            ).on_conflict(
+                conflict_target=[BadFile.file_path],
+                preserve=[BadFile.file_mtime, BadFile.file_size, BadFile.error],
+            ).execute()
+
+        for data in batch:
+            self.bad_files.pop(data.file_path, None)
+
+        for data in errors:
+            self.bad_files[data.file_path] = (data.file_mtime, data.file_size)
+
+        self.nb_errors += len(errors)
+        self.nb_written += len(batch)
+
+        # checkpoint the directories whose files are all written
+        if self.pending_directories is not None:
+            completed: list[str] = []
+
+            for data in batch:
+                directory = os.path.dirname(data.file_path)
+                self.pending_directories[directory] -= 1
+
+                if self.pending_directories[directory] == 0:
+                    completed.append(directory)
+
+            self._save_directories(completed)
+
+    def _get_artist(self, name: str | None) -> int | None:
+        if name is None:
+            return None
+
+        if name not in self.artists:
+            self.artists[name] = Artist.insert(
+                name=name, sort_name=utils.get_sort_key(name)
+            ).execute()
+
+        return self.artists[name]
+
+    def _get_genre(self, name: str | None) -> int | None:
+        if name is None:
+            return None
+
+        if name not in self.genres:
+            self.genres[name] = Genre.insert(
+                name=name, sort_name=utils.get_search_key(name)
+            ).execute()
+
+        return self.genres[name]
+
+    def _get_album(
+        self, name: str | None, artist: int | None, year: int | None
+    ) -> int | None:
+        if name is None:
+            return None
+
+        key = (name, artist)
+
+        if key not in self.albums:
+            album = Album.insert(
+                name=name,
+                sort_name=utils.get_sort_key(name),
+                artist=artist,
+                year=year,
+            ).execute()
+            self.albums[key] = album
+
+        return self.albums[key]
+
+
+def is_in(file_path: str, paths: list[str]) -> bool:
+    """Returns True if the file is one of the paths, or inside one of them"""
+    return any(
+        file_path == path or file_path.startswith(os.path.join(path, ""))
+        for path in paths
+    )
+
+
+def get_owners(song_ids: list[int]) -> tuple[set[int], set[int]]:
+    """Returns the ids of the albums and of the artists of some songs"""
+    albums: set[int] = set()
+    artists: set[int] = set()
+
+    for chunk in chunked(song_ids, MAX_VARIABLES):
+        for album_id, artist_id in (
+            Song.select(Song.album, Song.artist).where(Song.id.in_(chunk)).tuples()
+        ):
+            if album_id is not None:
+                albums.add(album_id)
+            if artist_id is not None:
+                artists.add(artist_id)
+
+    return (albums, artists)
+
+
+def update_aggregates(
+    album_ids: set[int] | None = None, artist_ids: set[int] | None = None
+) -> None:
+    """Compute the number of songs, duration, size and years of albums and
+    artists from their songs.
+
+    Args:
+        album_ids (set[int] | None, optional): the albums to update, all if None
+        artist_ids (set[int] | None, optional): the artists to update, all if None
+    """
+    for sql, ids in ((ALBUM_AGGREGATES, album_ids), (ARTIST_AGGREGATES, artist_ids)):
+        if ids is None:
+            db.db.execute_sql(f"{sql};")
+            continue
+
+        for chunk in chunked(list(ids), MAX_VARIABLES):
+            parameters = ",".join("?" * len(chunk))
+            db.db.execute_sql(f"{sql} WHERE id IN ({parameters});", chunk)
+
+
+def delete_orphans() -> None:
+    """Delete albums, artists and genres which are not used by any song"""
+    Album.delete().where(
+        ~fn.EXISTS(Song.select(Song.id).where(Song.album == Album.id))
+    ).execute()
+    Artist.delete().where(
+        ~fn.EXISTS(Song.select(Song.id).where(Song.artist == Artist.id)),
+        ~fn.EXISTS(Album.select(Album.id).where(Album.artist == Artist.id)),
+    ).execute()
+    Genre.delete().where(
+        ~fn.EXISTS(Song.select(Song.id).where(Song.genre == Genre.id))
+    ).execute()
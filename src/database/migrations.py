@@ -0,0 +1,158 @@
+"""Ordered changes of the schema, applied once to existing databases.
+
+New tables are created from the models (with their indexes), so the
+migrations must also work on a database that is already up to date.
+Migrations are never changed once released: add a new one instead."""
+
+import peewee
+from playhouse.migrate import SqliteMigrator
+from playhouse.migrate import migrate as run_migrations
+
+from . import fts, ingest, utils
+from .base_model import BaseModel, db
+
+
+class SchemaVersion(BaseModel):
+    """The migrations applied to the database"""
+
+    version = peewee.IntegerField(primary_key=True)
+    name = peewee.CharField()
+
+    class Meta:
+        table_name = "schema_version"
+
+
+def unique_albums() -> None:
+    """Merge the albums with the same name and artist, then prevent new ones"""
+    duplicates = db.execute_sql(
+        "SELECT MIN(id), GROUP_CONCAT(id) FROM album "
+        "WHERE name IS NOT NULL AND artist_id IS NOT NULL "
+        "GROUP BY name, artist_id HAVING COUNT(*) > 1;"
+    ).fetchall()
+
+    for album_id, album_ids in duplicates:
+        others = [
+            int(other) for other in album_ids.split(",") if int(other) != album_id
+        ]
+        parameters = ",".join("?" * len(others))
+
+        db.execute_sql(
+            f"UPDATE song SET album_id = ? WHERE album_id IN ({parameters});",
+            [album_id, *others],
+        )
+        db.execute_sql(
+            "UPDATE album SET year = "
+            "(SELECT MIN(year) FROM song WHERE album_id = album.id) WHERE id = ?;",
+            [album_id],
+        )
+        db.execute_sql(f"DELETE FROM album WHERE id IN ({parameters});", others)
+
+    db.execute_sql(
+        'CREATE UNIQUE INDEX IF NOT EXISTS "album_name_artist_id" '
+        'ON "album" ("name", "artist_id");'
+    )
+
+
+def browsing_indexes() -> None:
+    """Index the columns used to filter and sort songs and albums"""
+    db.execute_sql(
+        'CREATE INDEX IF NOT EXISTS "album_artist_id_year_name" '
+        'ON "album" ("artist_id", "year", "name");'
+    )
+    db.execute_sql(
+        'CREATE INDEX IF NOT EXISTS "song_album_id_disk_track_name" '
+        'ON "song" ("album_id", "disk", "track", "name");'
+    )
+    db.execute_sql('CREATE INDEX IF NOT EXISTS "song_year" ON "song" ("year");')
+
+
+def search_table() -> None:
+    """Create the full text search table of songs, and index them"""
+    fts.create_table()
+    fts.rebuild()
+
+
+def sort_names() -> None:
+    """Fill the sort keys of the existing names, and sort by them"""
+    for table, get_key in (
+        ("artist", utils.get_sort_key),
+        ("album", utils.get_sort_key),
+        ("song", utils.get_sort_key),
+        ("genre", utils.get_search_key),
+    ):
+        rows = db.execute_sql(
+            f'SELECT id, name FROM "{table}" WHERE name IS NOT NULL;'
+        ).fetchall()
+
+        db.connection().executemany(
+            f'UPDATE "{table}" SET sort_name = ? WHERE id = ?;',
+            [(get_key(name), row_id) for row_id, name in rows],
+        )
+
+    db.execute_sql('DROP INDEX IF EXISTS "album_artist_id_year_name";')
+    db.execute_sql('DROP INDEX IF EXISTS "song_album_id_disk_track_name";')
+    db.execute_sql(
+        'CREATE INDEX IF NOT EXISTS "album_artist_id_year_sort_name" '
+        'ON "album" ("artist_id", "year", "sort_name");'
+    )
+    db.execute_sql(
+        'CREATE INDEX IF NOT EXISTS "song_album_id_disk_track_sort_name" '
+        'ON "song" ("album_id", "disk", "track", "sort_name");'
+    )
+    db.execute_sql(
+        'CREATE INDEX IF NOT EXISTS "artist_sort_name" ON "artist" ("sort_name");'
+    )
+    db.execute_sql(
+        'CREATE INDEX IF NOT EXISTS "genre_sort_name" ON "genre" ("sort_name");'
+    )
+
+
+def aggregates() -> None:
+    """Compute the totals of the albums and artists"""
+    ingest.update_aggregates()
+
+
+def drop_status() -> None:
+    """Drop the status columns of the old mark and sweep scan"""
+    migrator = SqliteMigrator(db)
+
+    for table in ("song", "album", "artist", "genre"):
+        columns = [column.name for column in db.get_columns(table)]
+
+        # before SQLite 3.35, the table is rebuilt without the column
+        if "status" in columns:
+            run_migrations(migrator.drop_column(table, "status"))
+
+
+def album_years() -> None:
+    """Compute the first year of the albums again, it was only lowered"""
+    ingest.update_aggregates(None, set())
+
+
+# never reorder or remove a migration, their position is their version
+MIGRATIONS = [
+    unique_albums,
+    browsing_indexes,
+    search_table,
+    sort_names,
+    aggregates,
+    drop_status,
+    album_years,
+]
+
+
+def migrate() -> None:
+    """Apply the migrations not applied yet, each one in a transaction"""
+    db.create_tables([SchemaVersion])
+
+    current = SchemaVersion.select(peewee.fn.MAX(SchemaVersion.version)).scalar() or 0
+
+    for version, migration in enumerate(MIGRATIONS, 1):
+        if version <= current:
+            continue
+
+        with db.atomic():
+            migration()
+            SchemaVersion.create(version=version, name=migration.__name__)
+
+        print(f"Applied migration {version}: {migration.__name__}")
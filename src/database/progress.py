@@ -0,0 +1,81 @@
+import threading
+import time
+from collections.abc import Callable
+
+# minimal delay between two calls of on_change
+REPORT_INTERVAL = 0.2
+
+
+class ScanCancelled(Exception):
+    pass
+
+
+class ScanProgress:
+    """Counters of a running scan. It can be read and cancelled from another thread.
+
+    Args:
+        on_change (Callable[[ScanProgress], None] | None, optional): called
+            (from the scanning thread) when the counters changed
+    """
+
+    def __init__(
+        self, on_change: Callable[["ScanProgress"], None] | None = None
+    ) -> None:
+        self.on_change = on_change
+        self.cancel_event = threading.Event()
+        self.last_report = 0.0
+
+        self.seen = 0  # music files found in the directories
+        self.to_parse = 0  # new or changed files
+        self.parsed = 0
+        self.parsed_size = 0  # total size of the parsed files
+        self.written = 0
+        self.moved = 0  # known songs whose file was moved
+        self.deleted = 0  # songs whose file was not found
+        self.errors = 0  # files that could not be parsed
+        self.unreachable: list[str] = []  # music directories that can't be scanned
+        self.changed = False  # songs were written, moved or deleted
+        self.parse_start = 0.0
+
+    def __str__(self) -> str:
+        if self.parse_start == 0:
+            return f"Scanning: {self.seen} files found"
+
+        result = f"Scanning: {self.written}/{self.to_parse} files updated"
+        eta = self.get_eta()
+
+        if eta is not None:
+            result += f", {round(eta)} s left"
+
+        return result
+
+    def start_parsing(self, to_parse: int) -> None:
+        self.to_parse = to_parse
+        self.parse_start = time.monotonic()
+        self.report(True)
+
+    def get_eta(self) -> float | None:
+        """Returns the estimated number of seconds before the end of the scan"""
+        if self.parsed == 0:
+            return None
+
+        elapsed = time.monotonic() - self.parse_start
+
+        return elapsed / self.parsed * (self.to_parse - self.parsed)
+
+    def report(self, force: bool = False) -> None:
+        """Call on_change if the last call is old enough, and stop the scan
+        if it was cancelled"""
+        if self.cancel_event.is_set():
+            raise ScanCancelled()
+
+        now = time.monotonic()
+
+        if self.on_change is not None and (
+            force or now - self.last_report >= REPORT_INTERVAL
+        ):
+            self.last_report = now
+            self.on_change(self)
+
+    def cancel(self) -> None:
+        self.cancel_event.set()
@@ -0,0 +1,92 @@
+"""Read-only rows, to list many songs without building a peewee model per row.
+
+The models are still used to write, and to read or edit a single song."""
+
+from typing import NamedTuple
+
+from peewee import ModelSelect
+
+from .album import Album
+from .artist import Artist
+from .genre import Genre
+from .song import AlbumArtist, Song
+
+
+class SongRow(NamedTuple):
+    id: int
+    name: str | None
+    track: int | None
+    disk: int | None
+    year: int | None
+    duration: int
+    file_path: str
+    genre: str | None
+    artist_id: int | None
+    artist: str | None
+    album_id: int | None
+    album: str | None
+    album_year: int | None
+    album_artist_id: int | None
+    album_artist: str | None
+    album_nb_songs: int | None
+    album_duration: int | None
+
+
+class AlbumRow(NamedTuple):
+    id: int
+    name: str | None
+    year: int | None
+    artist_id: int | None
+    artist: str | None
+    nb_songs: int | None
+    duration: int | None
+
+
+# selected columns, in the order of the SongRow fields
+SONG_COLUMNS = [
+    Song.id,
+    Song.name,
+    Song.track,
+    Song.disk,
+    Song.year,
+    Song.duration,
+    Song.file_path,
+    Genre.name,
+    Artist.id,
+    Artist.name,
+    Album.id,
+    Album.name,
+    Album.year,
+    AlbumArtist.id,
+    AlbumArtist.name,
+    Album.nb_songs,
+    Album.duration,
+]
+
+
+def get_song_rows(query: ModelSelect) -> list[SongRow]:
+    """Returns the rows of a query made with Song.select_related.
+
+    Args:
+        query (ModelSelect): the query, its selected columns are replaced
+
+    Returns:
+        list[SongRow]: one row per song, in the order of the query
+    """
+    return [SongRow._make(row) for row in query.select(*SONG_COLUMNS).tuples()]
+
+
+def get_album_row(row: SongRow) -> AlbumRow | None:
+    """Returns the album of a song row, None if the song has no album"""
+    if row.album_id is None:
+        return None
+
+    return AlbumRow(
+        row.album_id,
+        row.album,
+        row.album_year,
+        row.album_artist_id,
+        row.album_artist,
+        row.album_nb_songs,
+        row.album_duration,
+    )
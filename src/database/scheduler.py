@@ -0,0 +1,185 @@
+"""Rescan music directories periodically, without disturbing other programs.
+
+The scanning thread runs with the lowest CPU and I/O priorities (on Linux,
+where they can be set for a thread only), and the scan is slowed down to
+stay under a number of files or bytes per second."""
+
+import ctypes
+import os
+import platform
+import threading
+import time
+from collections.abc import Callable
+
+from .progress import ScanCancelled, ScanProgress
+
+# check every second if a paused scan can continue
+PAUSE_CHECK_INTERVAL = 1.0
+
+# ioprio_set system call number, by machine
+IOPRIO_SET = {"x86_64": 251, "aarch64": 30, "i686": 289, "armv7l": 314}
+IOPRIO_WHO_PROCESS = 1
+IOPRIO_CLASS_IDLE = 3
+IOPRIO_CLASS_SHIFT = 13
+
+
+def lower_priority(whole_process: bool = False) -> None:
+    """Give the lowest CPU and I/O priorities to the calling thread, or to the
+    whole process.
+
+    Only Linux has priorities by thread: elsewhere, nothing is changed for
+    a thread, as an unprivileged process could never get its priority back."""
+    # on Linux, each thread has its own nice value and I/O priority
+    if whole_process:
+        thread_id = 0
+    elif platform.system() == "Linux":
+        thread_id = threading.get_native_id()
+    else:
+        return
+
+    try:
+        os.setpriority(os.PRIO_PROCESS, thread_id, 19)
+    except (AttributeError, OSError) as e:
+        print(f"Cannot lower the CPU priority ({e})")
+
+    syscall_number = IOPRIO_SET.get(platform.machine())
+
+    if platform.system() != "Linux" or syscall_number is None:
+        return
+
+    libc = ctypes.CDLL(None, use_errno=True)
+    ioprio = IOPRIO_CLASS_IDLE << IOPRIO_CLASS_SHIFT
+
+    if libc.syscall(syscall_number, IOPRIO_WHO_PROCESS, thread_id, ioprio) < 0:
+        errno = ctypes.get_errno()
+        print(f"Cannot lower the I/O priority ({os.strerror(errno)})")
+
+
+class BudgetedProgress(ScanProgress):
+    """Scan progress that slows down the scan to stay under a budget.
+
+    Args:
+        files_per_second (float, optional): maximum number of files listed
+            or parsed per second, 0 for no limit
+        bytes_per_second (float, optional): maximum size of the files parsed
+            per second, 0 for no limit
+        should_pause (Callable[[], bool] | None, optional): the scan stops
+            when it returns True (the written songs are kept), so it does not
+            hold the scan lock while paused
+        on_change (Callable[[ScanProgress], None] | None, optional): called
+            (from the scanning thread) when the counters changed
+    """
+
+    def __init__(
+        self,
+        files_per_second: float = 0,
+        bytes_per_second: float = 0,
+        should_pause: Callable[[], bool] | None = None,
+        on_change: Callable[[ScanProgress], None] | None = None,
+    ) -> None:
+        super().__init__(on_change)
+
+        self.files_per_second = files_per_second
+        self.bytes_per_second = bytes_per_second
+        self.should_pause = should_pause
+        self.paused = False
+        self.budget_start = time.monotonic()
+
+    def report(self, force: bool = False) -> None:
+        super().report(force)
+
+        if self.should_pause is not None and self.should_pause():
+            self.paused = True
+            raise ScanCancelled()
+
+        # time needed to stay under the budget
+        budget_time = 0.0
+
+        if self.files_per_second > 0:
+            budget_time = (self.seen + self.parsed) / self.files_per_second
+
+        if self.bytes_per_second > 0:
+            budget_time = max(budget_time, self.parsed_size / self.bytes_per_second)
+
+        delay = budget_time - (time.monotonic() - self.budget_start)
+
+        if delay > 0:
+            self.wait(delay)
+
+    def wait(self, delay: float) -> None:
+        if self.cancel_event.wait(delay):
+            raise ScanCancelled()
+
+
+class ScanScheduler:
+    """Run scans in a thread at regular intervals.
+
+    Args:
+        scan (Callable[[ScanProgress], None]): runs the scan
+        interval (float): seconds between the end of a scan and the next one
+        files_per_second (float, optional): see BudgetedProgress
+        bytes_per_second (float, optional): see BudgetedProgress
+        should_pause (Callable[[], bool] | None, optional): see BudgetedProgress
+    """
+
+    def __init__(
+        self,
+        scan: Callable[[ScanProgress], None],
+        interval: float,
+        files_per_second: float = 0,
+        bytes_per_second: float = 0,
+        should_pause: Callable[[], bool] | None = None,
+    ) -> None:
+        self.scan = scan
+        self.interval = interval
+        self.files_per_second = files_per_second
+        self.bytes_per_second = bytes_per_second
+        self.should_pause = should_pause
+
+        self.stop_event = threading.Event()
+        self.progress: ScanProgress | None = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self, wait: bool = True) -> None:
+        """Stop the thread, cancelling the running scan. If wait is False, the
+        thread is not waited for: a scan waiting for the scan lock can't be
+        interrupted, it stops as soon as it gets it."""
+        self.stop_event.set()
+
+        if self.progress is not None:
+            self.progress.cancel()
+
+        if wait:
+            self.thread.join()
+
+    def run(self) -> None:
+        lower_priority()
+        delay = self.interval
+
+        while not self.stop_event.wait(delay):
+            # don't start a scan while paused, it would hold the scan lock
+            if self.should_pause is not None and self.should_pause():
+                delay = PAUSE_CHECK_INTERVAL
+                continue
+
+            progress = BudgetedProgress(
+                self.files_per_second, self.bytes_per_second, self.should_pause
+            )
+            self.progress = progress
+
+            # stop() may have been called before progress was set
+            if self.stop_event.is_set():
+                break
+
+            try:
+                self.scan(progress)
+            except Exception as e:
+                print(f"Cannot run the scheduled scan: {e}")
+
+            self.progress = None
+
+            # a paused scan continues from its checkpoint when the pause ends
+            delay = PAUSE_CHECK_INTERVAL if progress.paused else self.interval
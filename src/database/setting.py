@@ -6,8 +6,17 @@ from .base_model import BaseModel
 
 
 class Key(enum.StrEnum):
+    DB_CACHE_SIZE = "db_cache_size"
+    DB_MMAP_SIZE = "db_mmap_size"
+    DB_TEMP_STORE = "db_temp_store"
     MUSIC_DIR = "music_dir"
     PLAYLIST = "playlist"
+    SCAN_BYTES_PER_SECOND = "scan_bytes_per_second"
+    SCAN_FILES_PER_SECOND = "scan_files_per_second"
+    SCAN_INTERVAL = "scan_interval"
+    SCAN_THREADS = "scan_threads"
+    SCAN_WORKERS = "scan_workers"
+    WATCH_MUSIC_DIR = "watch_music_dir"
     VOLUME = "volume"
     VOLUME_MUTED = "volume_muted"
     UI_GEOMETRY = "ui_geometry"
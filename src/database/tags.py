@@ -0,0 +1,168 @@
+"""Functions to read songs metadata from files.
+
+They don't use the database, so they can run in worker processes."""
+
+import hashlib
+import os
+import signal
+from typing import Any, BinaryIO, NamedTuple
+
+from mutagen import FileType
+from mutagen.easyid3 import EasyID3
+from mutagen.easymp4 import EasyMP4
+from mutagen.flac import FLAC
+from mutagen.id3._util import ID3NoHeaderError
+from mutagen.mp3 import EasyMP3, HeaderNotFoundError
+from mutagen.oggopus import OggOpus
+from mutagen.oggvorbis import OggVorbis
+
+from . import id3, utils
+
+# file extension => mutagen class reading tags and stream info in one pass
+# the tags of all these classes use the same keys as EasyID3
+READERS: dict[str, type[FileType]] = {
+    ".mp3": EasyMP3,
+    ".flac": FLAC,
+    ".ogg": OggVorbis,
+    ".opus": OggOpus,
+    ".m4a": EasyMP4,
+}
+
+MUSIC_EXTENSIONS = list(READERS.keys())
+
+# size of the blocks read at the start and the end of files to hash them
+HASH_BLOCK_SIZE = 64 * 1024
+
+
+class FileData(NamedTuple):
+    file_path: str
+    file_mtime: int
+    file_size: int
+    album: str | None
+    albumartist: str | None
+    artist: str | None
+    year: int | None
+    disk: int | None
+    disk_total: int | None
+    genre: str | None
+    title: str | None
+    track: int | None
+    track_total: int | None
+    duration: float
+    bitrate: int | None
+    sample_rate: int | None
+    channels: int | None
+    file_hash: str
+
+
+class FileError(NamedTuple):
+    file_path: str
+    file_mtime: int
+    file_size: int
+    error: str
+
+
+def is_music_file(file_path: str) -> bool:
+    return os.path.splitext(file_path)[1].lower() in MUSIC_EXTENSIONS
+
+
+def read_file(file_info: tuple[str, int, int]) -> FileData:
+    """Read tags, stream info and partial hash of a file, opening it only once.
+
+    Args:
+        file_info (tuple[str, int, int]): file path, mtime and size
+
+    Returns:
+        FileData: the data to store in database
+    """
+    file_path, file_mtime, file_size = file_info
+
+    extension = os.path.splitext(file_path)[1].lower()
+
+    with open(file_path, "rb") as file:
+        file_hash = hash_file(file, file_size)
+
+        # most MP3 files can be read without parsing the whole tag
+        fast_result = id3.read_mp3(file) if extension == ".mp3" else None
+
+        if fast_result is not None:
+            tag, info = fast_result
+        else:
+            tag, info = _read_with_mutagen(file, extension)
+
+    disk, disk_total = utils.get_numbers(tag, "discnumber")
+    track, track_total = utils.get_numbers(tag, "tracknumber")
+
+    return FileData(
+        file_path=file_path,
+        file_mtime=file_mtime,
+        file_size=file_size,
+        album=utils.get_str(tag, "album"),
+        albumartist=utils.get_str(tag, "albumartist"),
+        artist=utils.get_str(tag, "artist"),
+        year=utils.get_year(tag, "date"),
+        disk=disk,
+        disk_total=disk_total,
+        genre=utils.get_str(tag, "genre"),
+        title=utils.get_str(tag, "title", "<unknown>"),
+        track=track,
+        track_total=track_total,
+        duration=getattr(info, "length", 0),
+        bitrate=getattr(info, "bitrate", None),
+        sample_rate=getattr(info, "sample_rate", None),
+        channels=getattr(info, "channels", None),
+        file_hash=file_hash,
+    )
+
+
+def _read_with_mutagen(file: BinaryIO, extension: str) -> tuple[Any, Any]:
+    """Returns the tags (with EasyID3 keys) and the stream info of a file.
+
+    An MP3 file without audio stream is read if it has tags. The other
+    mutagen errors are raised, so the file is stored as a bad file."""
+    try:
+        audio = READERS[extension](file)
+        tag = audio.tags if audio.tags is not None else {}
+        info = audio.info
+    except HeaderNotFoundError as e:
+        # no audio stream found, but the tags may be readable
+        try:
+            file.seek(0)
+            tag = EasyID3(file)
+        except ID3NoHeaderError:
+            # without tags either, it is not a music file
+            raise e from None
+        info = None
+
+    return (tag, info)
+
+
+def init_worker() -> None:
+    """Ignore Ctrl+C in worker processes: the main process cancels the scan
+    and stops them, a worker killed by it would never return its result"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def try_read_file(file_info: tuple[str, int, int]) -> FileData | FileError:
+    """Same as read_file, but returns a FileError instead of raising"""
+    try:
+        return read_file(file_info)
+    except Exception as e:
+        return FileError(*file_info, f"{type(e).__name__}: {e}")
+
+
+def hash_file(file: BinaryIO, file_size: int) -> str:
+    """Hash the start and the end of a file. With the file size, it is enough
+    to recognize a file moved since the last scan."""
+    result = hashlib.blake2b(digest_size=16)
+
+    file.seek(0)
+    result.update(file.read(HASH_BLOCK_SIZE))
+
+    if file_size > HASH_BLOCK_SIZE:
+        file.seek(max(file_size - HASH_BLOCK_SIZE, HASH_BLOCK_SIZE))
+        result.update(file.read(HASH_BLOCK_SIZE))
+
+    file.seek(0)
+
+    return result.hexdigest()
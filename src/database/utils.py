@@ -1,11 +1,20 @@
 """Various functions to parse data from songs metadata"""
 
+import base64
+import unicodedata
 from datetime import datetime
 from io import BytesIO
-from peewee import CharField, IntegerField
+from peewee import CharField
 
+import mutagen
+from mutagen import FileType, MutagenError
 from mutagen.easyid3 import EasyID3
+from mutagen.flac import FLAC, Picture
 from mutagen.id3 import ID3
+from mutagen.mp4 import MP4
+
+# ignored at the start of names when sorting them
+SORT_ARTICLES = ("the ", "a ", "an ", "le ", "la ", "les ", "l'")
 
 
 def get_str(data: EasyID3, key: str, value_if_none: str | None = None) -> str | None:
@@ -26,9 +35,16 @@ def get_numbers(data: EasyID3, key: str) -> tuple[int | None, int | None]:
     split = value[0].split("/")
 
     if len(split) == 1:
-        return (split[0], None)
+        return (get_int(split[0]), None)
     else:
-        return (split[0], split[1])
+        return (get_int(split[0]), get_int(split[1]))
+
+
+def get_int(value: str) -> int | None:
+    try:
+        return int(value)
+    except ValueError:
+        return None
 
 
 def get_year(data: EasyID3, key: str) -> int | None:
@@ -50,18 +66,63 @@ def get_year(data: EasyID3, key: str) -> int | None:
 
 
 def get_cover(file_path: str) -> BytesIO | None:
-    tag = ID3(file_path)
-    pic = tag.get("APIC:")
-    if pic is not None:
-        pic = BytesIO(pic.data)
+    data: bytes | None = None
 
-    return pic
+    try:
+        if file_path.lower().endswith(".mp3"):
+            pic = ID3(file_path).get("APIC:")
+            data = pic.data if pic is not None else None
+        else:
+            data = _get_picture(mutagen.File(file_path))
+    except MutagenError:
+        return None
+
+    if data is None:
+        return None
 
+    return BytesIO(data)
 
-def match_str(db_field: CharField, input: str) -> bool:
-    # ToDo: ignore accentuated characters
-    return input.lower() in str(db_field).lower()
 
+def _get_picture(audio: FileType | None) -> bytes | None:
+    if audio is None or audio.tags is None:
+        return None
+
+    if isinstance(audio, FLAC) and len(audio.pictures) > 0:
+        return audio.pictures[0].data
+
+    if isinstance(audio, MP4) and "covr" in audio.tags:
+        return bytes(audio.tags["covr"][0])
 
-def match_int(db_field: IntegerField, input: str) -> bool:
-    return input in str(db_field)
+    # Ogg files store pictures as base64 FLAC picture blocks
+    if "metadata_block_picture" in audio.tags:
+        block = base64.b64decode(audio.tags["metadata_block_picture"][0])
+        return Picture(block).data
+
+    return None
+
+
+def get_search_key(value: str) -> str:
+    """Returns the value without case and accents, to compare it"""
+    decomposed = unicodedata.normalize("NFKD", value.casefold())
+
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def get_sort_key(value: str | None) -> str | None:
+    """Returns the value without case, accents and leading article, to sort it.
+
+    "The Beatles" is sorted as "beatles", but "The" stays "the"."""
+    if value is None:
+        return None
+
+    key = get_search_key(value).strip()
+
+    for article in SORT_ARTICLES:
+        if key.startswith(article) and len(key) > len(article):
+            return key[len(article) :].lstrip()
+
+    return key
+
+
+def match_str(db_field: CharField, input: str) -> bool:
+    return get_search_key(input) in get_search_key(str(db_field))
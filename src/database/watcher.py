@@ -0,0 +1,298 @@
+"""Watch directories for changed files.
+
+On Linux, inotify is used. Elsewhere (or if inotify can't be used),
+directories are polled periodically, only the changed ones are listed again."""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from collections.abc import Callable
+
+# wait for this delay without new events before reporting changes
+DELAY = 2.0
+# but don't wait longer than this if events keep coming
+MAX_DELAY = 10.0
+POLL_INTERVAL = 30.0
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+IN_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class Inotify:
+    def __init__(self, roots: list[str]) -> None:
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+
+        self.roots = roots
+        # watch descriptor => directory path
+        self.watches: dict[int, str] = {}
+
+        try:
+            for root in roots:
+                self.add_tree(root)
+        except OSError:
+            self.close()
+            raise
+
+    def add_tree(self, path: str) -> None:
+        for root, _, _ in os.walk(path):
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(root), IN_MASK)
+
+            if wd < 0:
+                errno = ctypes.get_errno()
+                raise OSError(errno, os.strerror(errno), root)
+
+            self.watches[wd] = root
+
+    def read(self, timeout: float) -> list[str]:
+        """Wait for events, and returns the changed paths"""
+        result: list[str] = []
+
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if len(ready) == 0:
+            return result
+
+        data = os.read(self.fd, 64 * 1024)
+        offset = 0
+
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+
+            # events were lost: the roots are scanned again, and the
+            # directories created meanwhile are watched
+            if mask & IN_Q_OVERFLOW:
+                for root in self.roots:
+                    try:
+                        self.add_tree(root)
+                    except OSError:
+                        pass
+                result.extend(self.roots)
+                continue
+
+            directory = self.watches.get(wd)
+
+            if directory is None:
+                continue
+
+            if mask & IN_IGNORED:
+                del self.watches[wd]
+                continue
+
+            # a created file may not be written yet, IN_CLOSE_WRITE will follow
+            if mask & IN_CREATE and not mask & IN_ISDIR:
+                continue
+
+            path = os.path.join(directory, os.fsdecode(name))
+
+            # new directories must be watched too
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                try:
+                    self.add_tree(path)
+                except OSError:
+                    pass
+
+            result.append(path)
+
+        return result
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class Poller:
+    """Poll the directories periodically.
+
+    Only the directories whose mtime changed are listed again, and only their
+    files are checked. As for a scan, a file modified in place is not found:
+    it does not change the mtime of its directory."""
+
+    def __init__(self, roots: list[str], stop_event: threading.Event) -> None:
+        self.roots = roots
+        self.stop_event = stop_event
+        # directory path => (mtime, sub directories)
+        self.directories: dict[str, tuple[int, list[str]]] = {}
+        # directory path => file path => (mtime, size) of its files
+        self.files: dict[str, dict[str, tuple[int, int]]] = {}
+        self.poll()
+        self.next_poll = time.monotonic() + POLL_INTERVAL
+
+    def poll(self) -> list[str]:
+        """Returns the paths changed since the last poll.
+
+        The directories of a root that can't be accessed (unmounted disk or
+        share) are kept as they were, so their files are not reported as deleted."""
+        result: list[str] = []
+
+        for root in self.roots:
+            if not os.path.isdir(root):
+                continue
+
+            stack = [root]
+
+            while len(stack) > 0 and not self.stop_event.is_set():
+                stack.extend(self.poll_directory(stack.pop(), result))
+
+        return result
+
+    def poll_directory(self, path: str, result: list[str]) -> list[str]:
+        """Add the changed paths of a directory to result, and returns its
+        sub directories"""
+        known = self.directories.get(path)
+
+        try:
+            # before listing, so a change during the listing is found next time
+            mtime = os.stat(path).st_mtime_ns
+
+            if known is not None and known[0] == mtime:
+                return known[1]
+
+            with os.scandir(path) as it:
+                entries = list(it)
+        except OSError:
+            # removed since its parent was listed
+            if known is not None:
+                self.forget(path)
+                result.append(path)
+            return []
+
+        directories: list[str] = []
+        files: dict[str, tuple[int, int]] = {}
+
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    directories.append(os.path.normpath(entry.path))
+                elif entry.is_file():
+                    stats = entry.stat()
+                    files[os.path.normpath(entry.path)] = (
+                        int(stats.st_mtime),
+                        stats.st_size,
+                    )
+            except OSError:
+                continue
+
+        old_files = self.files.get(path, {})
+        result.extend(
+            file_path
+            for file_path in files.keys() | old_files.keys()
+            if files.get(file_path) != old_files.get(file_path)
+        )
+
+        # the songs of a removed directory are deleted by updating its path
+        for directory in known[1] if known is not None else []:
+            if directory not in directories:
+                self.forget(directory)
+                result.append(directory)
+
+        self.directories[path] = (mtime, directories)
+        self.files[path] = files
+
+        return directories
+
+    def forget(self, path: str) -> None:
+        """Forget a directory and its sub directories"""
+        known = self.directories.pop(path, None)
+        self.files.pop(path, None)
+
+        for directory in known[1] if known is not None else []:
+            self.forget(directory)
+
+    def read(self, timeout: float) -> list[str]:
+        """Wait for the timeout, and returns the changed paths if it is time to poll"""
+        if self.stop_event.wait(timeout) or time.monotonic() < self.next_poll:
+            return []
+
+        self.next_poll = time.monotonic() + POLL_INTERVAL
+
+        return self.poll()
+
+    def close(self) -> None:
+        pass
+
+
+class Watcher:
+    """Watch directories in a thread, and call on_change with the changed paths.
+
+    Bursts of events are grouped in one call."""
+
+    def __init__(
+        self, roots: list[str], on_change: Callable[[list[str]], None]
+    ) -> None:
+        self.roots = [os.path.normpath(root) for root in roots]
+        self.on_change = on_change
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self, wait: bool = True) -> None:
+        """Stop the thread. If wait is False, the running update is not
+        waited for (it may be waiting for a scan), the thread stops after it."""
+        self.stop_event.set()
+
+        if wait:
+            self.thread.join()
+
+    def run(self) -> None:
+        backend: Inotify | Poller
+
+        try:
+            if not sys.platform.startswith("linux"):
+                raise OSError("inotify is only available on Linux")
+            backend = Inotify(self.roots)
+        except (OSError, AttributeError) as e:
+            print(f"Cannot use inotify ({e}), polling music directories")
+            backend = Poller(self.roots, self.stop_event)
+
+        pending: set[str] = set()
+        first_event = last_event = 0.0
+
+        while not self.stop_event.is_set():
+            paths = [path for path in backend.read(0.5) if self.is_watched(path)]
+            now = time.monotonic()
+
+            if len(paths) > 0:
+                if len(pending) == 0:
+                    first_event = now
+                last_event = now
+                pending.update(paths)
+
+            if len(pending) > 0 and (
+                now - last_event >= DELAY or now - first_event >= MAX_DELAY
+            ):
+                try:
+                    self.on_change(sorted(pending))
+                except Exception as e:
+                    print(f"Cannot update changed files: {e}")
+                pending.clear()
+
+        backend.close()
+
+    def is_watched(self, path: str) -> bool:
+        return any(
+            path == root or path.startswith(os.path.join(root, ""))
+            for root in self.roots
+        )
@@ -2,7 +2,7 @@ from PySide6 import QtWidgets
 
 from .. import database
 from ..database.album import Album
-from ..database.song import Song
+from ..database.rows import AlbumRow, SongRow, get_album_row
 from ..player import Player
 from . import utils
 from .navigation import NavigationWidget
@@ -63,36 +63,45 @@ class BrowserWidget(QtWidgets.QWidget):
 
         self.song_list.clear()
 
-        for artist in database.get_artists(has_album=True):
-            artist_item = QtWidgets.QTreeWidgetItem()
-            artist_item.setText(0, str(artist.name))
-            artist_item.setData(0, DATA, artist)
-            self.song_list.addTopLevelItem(artist_item)
-
-            for album in database.get_albums(artist):
+        artist_item = album_item = QtWidgets.QTreeWidgetItem()
+        artist_id = album_id = None
+
+        # the songs are ordered by album artist and album, so the tree is built
+        # from one query, adding an artist or album item when it changes
+        for song in database.get_library_rows():
+            if song.album_artist_id != artist_id:
+                artist_id = song.album_artist_id
+                artist_item = QtWidgets.QTreeWidgetItem()
+                artist_item.setText(0, str(song.album_artist))
+                artist_item.setData(0, DATA, artist_id)
+                self.song_list.addTopLevelItem(artist_item)
+
+            if song.album_id != album_id:
+                album_id = song.album_id
                 album_item = QtWidgets.QTreeWidgetItem()
-                album_item.setText(0, f"[{album.year}] {album.name}")
-                album_item.setData(0, DATA, album)
+                album_item.setText(0, f"[{song.album_year}] {song.album}")
+                album_item.setText(1, f"{song.album_nb_songs} songs")
+                album_item.setText(2, utils.s_to_t(song.album_duration or 0))
+                album_item.setData(0, DATA, get_album_row(song))
                 artist_item.addChild(album_item)
 
-                for song in database.get_songs(album):
-                    song_item = QtWidgets.QTreeWidgetItem()
+            song_item = QtWidgets.QTreeWidgetItem()
 
-                    name = ""
-                    if song.disk is not None:
-                        name += f"CD {song.disk} - "
-                    if song.track is not None:
-                        name += f"{song.track} - "
-                    name += song.name
+            name = ""
+            if song.disk is not None:
+                name += f"CD {song.disk} - "
+            if song.track is not None:
+                name += f"{song.track} - "
+            name += song.name
 
-                    song_item.setText(0, name)
-                    if song.artist.name != song.album.artist.name:
-                        song_item.setText(1, song.artist.name)
-                    song_item.setText(2, utils.s_to_t(song.duration))
-                    song_item.setData(0, DATA, song)
-                    album_item.addChild(song_item)
+            song_item.setText(0, name)
+            if song.artist is not None and song.artist_id != artist_id:
+                song_item.setText(1, song.artist)
+            song_item.setText(2, utils.s_to_t(song.duration))
+            song_item.setData(0, DATA, song)
+            album_item.addChild(song_item)
 
-            artist_item.setExpanded(True)
+        self.song_list.expandToDepth(0)
 
     def do_search(self) -> None:
         hide_song: bool
@@ -100,14 +109,20 @@ class BrowserWidget(QtWidgets.QWidget):
         hide_artist: bool
         match_search: bool
         match_filter: bool
-        filter_category: str = ""
-        filter_value: str = ""
 
         # get search strins from search bar
         search_value = self.search_bar.text()
 
-        # and navigation bar
-        filter_category, filter_value = self.navigation.get_selected()
+        # ids of the songs matching the search, None if there is no search
+        found_ids: set[int] | None = None
+        if search_value.strip() != "":
+            found_ids = set(database.search(search_value, ranked=False))
+
+        # and ids of the songs having the value selected in navigation bar
+        filter_ids: set[int] | None = None
+        selected = self.navigation.get_selected()
+        if selected is not None:
+            filter_ids = database.get_facet_song_ids(selected.facet, selected.value)
 
         root = self.song_list.invisibleRootItem()
 
@@ -123,33 +138,15 @@ class BrowserWidget(QtWidgets.QWidget):
 
                 for k in range(album.childCount()):
                     song = album.child(k)
-                    song_data: Song = song.data(0, DATA)
+                    song_data: SongRow = song.data(0, DATA)
 
                     # check if the song matches with search input
                     # if input is empty, it does matche
-                    match_search = song_data.match(search_value)
-
-                    # check if the song matches with filter set by navigator
-                    # if match filter is empty, it does match
-                    match_filter = (
-                        filter_category == ""
-                        or (
-                            filter_category == "Album Artist"
-                            and str(song_data.album.artist) == filter_value
-                        )
-                        or (
-                            filter_category == "Song Artist"
-                            and str(song_data.artist) == filter_value
-                        )
-                        or (
-                            filter_category == "Genre"
-                            and str(song_data.genre) == filter_value
-                        )
-                        or (
-                            filter_category == "Year"
-                            and str(song_data.year) == filter_value
-                        )
-                    )
+                    match_search = found_ids is None or song_data.id in found_ids
+
+                    # check if the song has the value selected in navigator
+                    # if no value is selected, it does match
+                    match_filter = filter_ids is None or song_data.id in filter_ids
 
                     # hide the song if it does not match with both search and filter
                     hide_song = not (match_search and match_filter)
@@ -201,7 +198,7 @@ class BrowserWidget(QtWidgets.QWidget):
                     for k in range(album.childCount()):
                         song = album.child(k)
 
-                        if song.data(0, DATA).get_id() == playing_song_id:
+                        if song.data(0, DATA).id == playing_song_id:
                             # without this, successives call to do_focus_playing_song do not select the song
                             self.song_list.setCurrentItem(root.child(0))
                             self.song_list.clearSelection()
@@ -230,12 +227,17 @@ class BrowserWidget(QtWidgets.QWidget):
         """
         data = item.data(0, DATA)
 
-        if type(data) is Song:
-            self.player.add_song(data)
-            return True
-        elif type(data) is Album:
-            self.player.add_album(data)
-            return True
+        # the song or album may have been deleted since the list was built
+        if type(data) is SongRow:
+            songs = database.get_songs_by_ids([data.id])
+            if len(songs) > 0:
+                self.player.add_song(songs[0])
+            return len(songs) > 0
+        elif type(data) is AlbumRow:
+            album = Album.get_or_none(Album.id == data.id)
+            if album is not None:
+                self.player.add_album(album)
+            return album is not None
         else:
             return False
 
@@ -1,8 +1,9 @@
 import base64
+import os
 
 from pynput import keyboard
 from PySide6 import QtGui
-from PySide6.QtCore import QTimer
+from PySide6.QtCore import QTimer, Signal
 from PySide6.QtGui import QAction
 from PySide6.QtWidgets import (
     QHBoxLayout,
@@ -10,26 +11,32 @@ from PySide6.QtWidgets import (
     QMenu,
     QMenuBar,
     QMessageBox,
-    QSplashScreen,
     QSystemTrayIcon,
     QVBoxLayout,
     QWidget,
 )
 
 from .. import database
+from ..database.progress import ScanProgress
+from ..database.scheduler import ScanScheduler
 from ..database.setting import Key, Setting
-from ..player import Player
+from ..database.watcher import Watcher
+from ..player import Player, State
 from .browser import BrowserWidget
 from .controls import ControlsWidget
 from .directory_picker import DirectoryPicker
 from .icons import ICON
 from .playlist import PlaylistWidget
+from .scan import CompactThread, ScanThread
 from .song_info import SongInfoWidget
 
 UPDATE_DELAY = 100  # 0.1 s
 
 
 class MainWindow(QMainWindow):
+    # emitted from the watcher thread when the database changed
+    library_changed = Signal()
+
     def __init__(self):
         super().__init__()
 
@@ -52,6 +59,20 @@ class MainWindow(QMainWindow):
         self.action_rescan = QtGui.QAction("Rescan database")
         self.menu_bar.addAction(self.action_rescan)
 
+        self.action_cancel_scan = QtGui.QAction("Cancel scan")
+        self.action_cancel_scan.setVisible(False)
+        self.menu_bar.addAction(self.action_cancel_scan)
+
+        self.action_compact = QtGui.QAction("Compact database")
+        self.menu_bar.addAction(self.action_compact)
+
+        self.action_watch = QtGui.QAction("Watch music folders")
+        self.action_watch.setCheckable(True)
+        self.action_watch.setChecked(
+            Setting.get_value(Key.WATCH_MUSIC_DIR, "False") == "True"
+        )
+        self.menu_bar.addAction(self.action_watch)
+
         # UI building => Side = Playlist + Song info
 
         side_widget = QWidget()
@@ -127,6 +148,10 @@ class MainWindow(QMainWindow):
         # Connect UI
 
         self.action_rescan.triggered.connect(self.do_scan)
+        self.action_cancel_scan.triggered.connect(self.do_cancel_scan)
+        self.action_compact.triggered.connect(self.do_compact)
+        self.action_watch.toggled.connect(self.do_toggle_watch)
+        self.library_changed.connect(self.do_update_library)
 
         # Keyboard shortcuts
 
@@ -150,9 +175,18 @@ class MainWindow(QMainWindow):
 
         # Function calls
 
+        self.watcher: Watcher | None = None
+        self.scan_thread: ScanThread | None = None
+        self.compact_thread: CompactThread | None = None
+        self.scheduler: ScanScheduler | None = None
+        self.music_devices: set[int] = set()
+
         if not database.has_songs():
             self.do_scan()
 
+        self.do_toggle_watch(self.action_watch.isChecked())
+        self.start_scheduler()
+
         # get geometry/state from settings
         geometry = Setting.get_value(Key.UI_GEOMETRY)
         state = Setting.get_value(Key.UI_STATE)
@@ -184,6 +218,13 @@ class MainWindow(QMainWindow):
         self.controls.update_ui()
         self.browser.update_ui()
 
+        # compacting would wait for the scheduled scans and watcher updates too
+        self.action_compact.setEnabled(
+            self.scan_thread is None
+            and self.compact_thread is None
+            and not database.is_busy()
+        )
+
     def do_hadle_keypress(self, key):
         if key == keyboard.Key.media_previous:
             self.controls.do_previous()
@@ -194,51 +235,177 @@ class MainWindow(QMainWindow):
         elif key == keyboard.Key.media_stop:
             self.controls.do_stop()
 
-    def do_scan(self) -> None:
-        # open directory picker with known MUSIC_DIR setting
+    def get_music_dirs(self) -> list[str]:
         setting = Setting.get_value(Key.MUSIC_DIR)
 
         if setting == "":
-            dir_list = []
+            return []
         else:
-            dir_list = setting.split(";")
+            return setting.split(";")
+
+    def do_toggle_watch(self, checked: bool) -> None:
+        Setting.upsert(Key.WATCH_MUSIC_DIR, str(checked))
+
+        # not joined: the watcher thread may be waiting for a scheduled scan
+        if self.watcher is not None:
+            self.watcher.stop(wait=False)
+            self.watcher = None
+
+        if checked:
+            self.watcher = database.watch(
+                self.get_music_dirs(), self.library_changed.emit
+            )
+
+    def start_scheduler(self) -> None:
+        """(Re)start the periodic rescans, if enabled in the settings"""
+        # not joined: the scheduled scan may be waiting for a watcher update
+        if self.scheduler is not None:
+            self.scheduler.stop(wait=False)
+            self.scheduler = None
+
+        # not while a scan is already running
+        if self.scan_thread is not None:
+            return
+
+        dir_list = self.get_music_dirs()
+        self.music_devices = set()
+
+        for path in dir_list:
+            try:
+                self.music_devices.add(os.stat(path).st_dev)
+            except OSError:
+                continue
+
+        self.scheduler = database.schedule_scans(
+            dir_list, self.library_changed.emit, self.is_playing_from_music_dirs
+        )
+
+    def is_playing_from_music_dirs(self) -> bool:
+        """Returns True if the playing song is on the same disk as a music
+        directory. Called from the scheduler thread."""
+        song = self.player.playlist.get_current()
+
+        if self.player.state != State.PLAY or song is None:
+            return False
+
+        try:
+            return os.stat(song.file_path).st_dev in self.music_devices
+        except OSError:
+            return False
+
+    def do_update_library(self) -> None:
+        self.browser.update_data()
+        self.player.playlist.clean()
+
+    def do_scan(self) -> None:
+        # open directory picker with known MUSIC_DIR setting
+        dir_list = self.get_music_dirs()
 
         picker = DirectoryPicker(self, dir_list)
 
         if picker.exec():
-            # stop any playing music, and the UI updates
-            self.player.stop()
-            self.timer.stop()
-
             # store the obtained directory list in setting
             dir_list = picker.get_dir_list()
             Setting.upsert(Key.MUSIC_DIR, ";".join(dir_list))
 
-            splash = QSplashScreen()
-            splash.show()
-            splash.showMessage("Database scan in progress")
-            database.scan(dir_list)
-            splash.finish(self)
+            # the scan runs in a thread, playing and browsing keep working
+            if self.scheduler is not None:
+                self.scheduler.stop(wait=False)
+                self.scheduler = None
+
+            # check every file: tags edited in place don't change the mtime
+            # of their directory, so a pruned scan would miss them
+            self.scan_thread = ScanThread(self, dir_list, full=True)
+            self.scan_thread.progress.connect(self.do_show_scan_progress)
+            self.scan_thread.finished.connect(self.do_scan_finished)
 
-            # restart updating
-            self.timer.start()
+            self.action_rescan.setEnabled(False)
+            self.action_cancel_scan.setVisible(True)
+            self.statusBar().showMessage("Scanning")
+
+            self.scan_thread.start()
+        elif not database.has_songs():
+            self.show_empty_database()
 
         del picker
 
+    def do_show_scan_progress(self, progress: ScanProgress) -> None:
+        self.statusBar().showMessage(str(progress))
+
+    def do_cancel_scan(self) -> None:
+        if self.scan_thread is not None:
+            self.scan_thread.cancel()
+            self.statusBar().showMessage("Cancelling the scan")
+
+    def do_scan_finished(self) -> None:
+        if self.scan_thread is None:
+            return
+
+        if self.scan_thread.completed:
+            self.statusBar().showMessage("Scan finished", 5000)
+        else:
+            self.statusBar().showMessage("Scan cancelled", 5000)
+
+        self.scan_thread.deleteLater()
+        self.scan_thread = None
+        self.action_rescan.setEnabled(True)
+        self.action_cancel_scan.setVisible(False)
+
+        # watch and rescan the new directory list
+        if self.watcher is not None:
+            self.do_toggle_watch(True)
+
+        self.start_scheduler()
+
         if not database.has_songs():
-            QMessageBox.information(
-                self,
-                "Empty database",
-                "There are no songs in the database. Please scan another directory.",
-            )
+            self.show_empty_database()
 
         # after rescanning, we update browser data
-        self.browser.update_data()
-
         # and we clean playlist from non existent files
-        self.player.playlist.clean()
+        self.do_update_library()
+
+    def do_compact(self) -> None:
+        # the VACUUM runs in a thread, playing and browsing keep working
+        self.compact_thread = CompactThread(self)
+        self.compact_thread.finished.connect(self.do_compact_finished)
+
+        self.statusBar().showMessage("Compacting the database")
+
+        self.compact_thread.start()
+
+    def do_compact_finished(self) -> None:
+        if self.compact_thread is None:
+            return
+
+        self.statusBar().showMessage("Database compacted", 5000)
+
+        self.compact_thread.deleteLater()
+        self.compact_thread = None
+
+    def show_empty_database(self) -> None:
+        QMessageBox.information(
+            self,
+            "Empty database",
+            "There are no songs in the database. Please scan another directory.",
+        )
 
     def closeEvent(self, event):
+        # scans are stopped first, the watcher may be waiting for their lock
+        if self.scheduler is not None:
+            self.scheduler.stop()
+
+        # the songs written so far are kept, the next scan continues from them
+        if self.scan_thread is not None:
+            self.scan_thread.cancel()
+            self.scan_thread.wait()
+
+        # a VACUUM can't be cancelled
+        if self.compact_thread is not None:
+            self.compact_thread.wait()
+
+        if self.watcher is not None:
+            self.watcher.stop()
+
         self.player.quit()
         self.key_listener.stop()
 
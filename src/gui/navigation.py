@@ -1,9 +1,12 @@
 from PySide6 import QtWidgets
 
 from .. import database
+from ..database.facets import Facet, FacetValue
 from ..player import Player
 from .icons import ICON
 
+DATA = -1
+
 
 class NavigationWidget(QtWidgets.QWidget):
     def __init__(self, parent: QtWidgets.QWidget, player: Player) -> None:
@@ -42,19 +45,15 @@ class NavigationWidget(QtWidgets.QWidget):
     def update_data(self) -> None:
         self.item_list.clear()
 
-        for name, items in [
-            ("Album Artist", database.get_artists(has_album=True)),
-            ("Song Artist", database.get_artists(has_song=True)),
-            ("Genre", database.get_genres()),
-            ("Year", database.get_years()),  # TODO filter by decade and not by year
-        ]:
+        for facet in Facet:
             category = QtWidgets.QTreeWidgetItem()
-            category.setText(0, name)
+            category.setText(0, facet)
             self.item_list.addTopLevelItem(category)
 
-            for item in items:
+            for item in database.get_facet_values(facet):
                 filter = QtWidgets.QTreeWidgetItem()
-                filter.setText(0, str(item))
+                filter.setText(0, f"{item.label} ({item.count})")
+                filter.setData(0, DATA, item)
                 category.addChild(filter)
 
         self.do_clear_filter()
@@ -73,8 +72,8 @@ class NavigationWidget(QtWidgets.QWidget):
             for j in range(category.childCount()):
                 filter = category.child(j)
 
-                # ToDo: ignore accentuated characters
-                hide_filter = input.lower() not in filter.text(0).lower()
+                label = filter.data(0, DATA).label
+                hide_filter = not database.utils.match_str(label, input)
 
                 filter.setHidden(hide_filter)
 
@@ -90,9 +89,9 @@ class NavigationWidget(QtWidgets.QWidget):
         self.search_bar.clear()
         self.item_list.setCurrentItem(None)  # type: ignore
 
-    def get_selected(self) -> tuple[str, str]:
+    def get_selected(self) -> FacetValue | None:
         current = self.item_list.currentItem()
         if current is None or current.parent() is None:
-            return ("", "")
+            return None
 
-        return (current.parent().text(0), current.text(0))
+        return current.data(0, DATA)
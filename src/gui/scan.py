@@ -0,0 +1,36 @@
+from PySide6.QtCore import QObject, QThread, Signal
+
+from .. import database
+from ..database.progress import ScanProgress
+
+
+class ScanThread(QThread):
+    """Scan music directories without blocking the GUI"""
+
+    # emitted from the scan thread, with the ScanProgress
+    progress = Signal(object)
+
+    def __init__(
+        self, parent: QObject, dir_list: list[str], full: bool = False
+    ) -> None:
+        super().__init__(parent=parent)
+
+        self.dir_list = dir_list
+        self.full = full
+        self.scan_progress = ScanProgress(self.progress.emit)
+        self.completed = False
+
+    def run(self) -> None:
+        self.completed = database.scan(
+            self.dir_list, full=self.full, progress=self.scan_progress
+        )
+
+    def cancel(self) -> None:
+        self.scan_progress.cancel()
+
+
+class CompactThread(QThread):
+    """Compact the database without blocking the GUI"""
+
+    def run(self) -> None:
+        database.compact()
@@ -49,13 +49,21 @@ class Playlist:
             return
 
         cur, songs = playlist.split("|")
+        song_ids = [int(song_id) for song_id in songs.split(",")]
 
-        self.current_song = int(cur)
+        self.set_songs(song_ids, int(cur))
 
+    def set_songs(self, song_ids: list[int], current: int) -> None:
+        """Get the songs from the database, the ids of deleted songs are ignored"""
         self.song_list.clear()
+        self.song_list.extend(database.get_songs_by_ids(song_ids))
 
-        for song_id in songs.split(","):
-            self.song_list.append(Song.get_by_id(song_id))
+        # the current song moves back for each deleted song before it
+        # (or if it is deleted itself)
+        found = {song.get_id() for song in self.song_list}
+        self.current_song = current - sum(
+            1 for song_id in song_ids[: current + 1] if song_id not in found
+        )
 
     def get_current(self) -> Song | None:
         # if playlist is empty, return None
@@ -104,14 +112,8 @@ class Playlist:
         return False
 
     def clean(self) -> None:
-        # loop on reverse list
-        for index, song in reversed(list(enumerate(self.song_list))):
-            if not Song.file_exists(song.file_path):
-                self.song_list.pop(index)
-
-                # if the removed song is the current song or before
-                if index <= self.current_song:
-                    # we decrement the current song to follow
-                    self.current_song -= 1
+        # songs are found by id: moved songs stay, with their new file path
+        song_ids = [song.get_id() for song in self.song_list]
+        self.set_songs(song_ids, self.current_song)
 
         self.populate(0)